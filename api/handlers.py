@@ -1,20 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Depends, Header
 from pydantic import BaseModel
 from typing import Optional, List, Any
-from datetime import datetime
+from datetime import datetime, date, timedelta
+import asyncio
 import html
+import json
 import base64
 import uuid
 import os
 import re
+import secrets
+import shutil
 from io import BytesIO
 
-from database.manager import DatabaseManager
-from utils.helpers import notify_moderators_web, save_base64_image, extract_base64_from_img_tags
+from database.provider import db
+from utils.helpers import save_base64_image, move_staged_photos, extract_base64_from_img_tags
+from utils.outbox import wake_outbox_workers
 from config import Config
 
 router = APIRouter()
-db = DatabaseManager()
 
 class PhotoData(BaseModel):
     ContentType: Optional[str] = None
@@ -60,31 +64,48 @@ async def create_question_from_web(request: WebQuestionRequest):
             f"💻 <b>Информация об устройстве:</b>\n{device_info.replace('<br>', '\n')}"
         )
         
-        # Создаем запись в базе данных
-        # Для веб-вопросов используем user_id = 0 (системный пользователь)
-        question_id = db.add_question(0, question_text)
-        
         # Извлекаем base64 данные из ImgTags
         base64_images = extract_base64_from_img_tags(request.ImgTags)
         
-        # Обрабатываем base64 фото из ImgTags
-        saved_photos = []
-        photo_index = 0
+        # Фото декодируются и пишутся на диск во временную папку до транзакции,
+        # внутри нее папка только переименовывается в папку вопроса
+        staging_name = f"staging-{uuid.uuid4().hex}"
         
-        for photo_base64 in base64_images[:3]:  # Ограничиваем до 3 фото
-            if photo_base64 and photo_base64.strip():
-                try:
-                    # Сохраняем base64 фото в файл
-                    photo_path = save_base64_image(photo_base64, question_id, photo_index)
-                    if photo_path:
-                        saved_photos.append(photo_path)
-                        photo_index += 1
-                except Exception as e:
-                    print(f"❌ Ошибка обработки фото: {e}")
-                    # Продолжаем обработку даже если одно фото не сохранилось
+        def save_photos() -> list:
+            """Сохраняет фото во временную папку"""
+            saved_photos = []
+            photo_index = 0
+            
+            for photo_base64 in base64_images[:3]:  # Ограничиваем до 3 фото
+                if photo_base64 and photo_base64.strip():
+                    try:
+                        # Сохраняем base64 фото в файл
+                        photo_path = save_base64_image(photo_base64, staging_name, photo_index)
+                        if photo_path:
+                            saved_photos.append(photo_path)
+                            photo_index += 1
+                    except Exception as e:
+                        print(f"❌ Ошибка обработки фото: {e}")
+                        # Продолжаем обработку даже если одно фото не сохранилось
+            
+            return saved_photos
         
-        # Уведомляем модераторов
-        await notify_moderators_web(question_id, question_text, saved_photos)
+        saved_photos = await asyncio.to_thread(save_photos)
+        
+        # Создаем запись в базе данных вместе с задачей уведомления модераторов
+        # Для веб-вопросов используем user_id = 0 (системный пользователь)
+        try:
+            question_id = await db.create_question(
+                0,
+                question_text,
+                prepare_payload=lambda question_id: {
+                    'photo_paths': move_staged_photos(staging_name, question_id, saved_photos)
+                }
+            )
+        except Exception:
+            shutil.rmtree(os.path.join(Config.PHOTOS_DIR, staging_name), ignore_errors=True)
+            raise
+        wake_outbox_workers()
         
         return WebQuestionResponse(
             success=True,
@@ -102,25 +123,141 @@ async def create_question_from_web(request: WebQuestionRequest):
 async def get_question_status(question_id: int):
     """Получение статуса вопроса"""
     try:
-        question = db.get_question(question_id)
-        if not question:
+        detail = await db.get_question_detail(question_id)
+        if not detail:
             raise HTTPException(status_code=404, detail="Вопрос не найден")
         
-        status = db.get_question_status(question_id)
-        answers = db.get_question_answers(question_id)
-        
         return {
-            "question_id": question_id,
-            "status": status,
-            "created_at": question[4],  # created_at поле
-            "answers": answers
+            "question_id": detail.question.id,
+            "status": detail.question.status,
+            "created_at": detail.question.created_at,
+            "photos_count": len(detail.photos),
+            "answers": [answer._asdict() for answer in detail.answers]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при получении статуса вопроса: {str(e)}"
         )
 
+def require_admin_token(x_api_key: Optional[str] = Header(None)):
+    """Доступ к административным эндпоинтам только по ключу Config.ADMIN_API_TOKEN"""
+    if not Config.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Административный API отключен")
+    if not x_api_key or not secrets.compare_digest(x_api_key, Config.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=401, detail="Неверный ключ API")
+
+def encode_cursor(created_at: str, record_id: int) -> str:
+    """Непрозрачный курсор страницы из ключа (created_at, id) последней записи"""
+    raw = json.dumps([created_at, record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Разбор курсора страницы; при некорректном курсоре — ошибка 400"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return str(created_at), int(record_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+def build_page(records: list, limit: int) -> dict:
+    """Формирование страницы: записи и курсор следующей страницы"""
+    has_more = len(records) > limit
+    records = records[:limit]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(records[-1].created_at, records[-1].id)
+    return {
+        "items": [record._asdict() for record in records],
+        "next_cursor": next_cursor
+    }
+
+def date_range(date_from: Optional[date], date_to: Optional[date]) -> tuple:
+    """Границы выборки по датам: date_from и date_to включительно"""
+    start = date_from.isoformat() if date_from else None
+    end = (date_to + timedelta(days=1)).isoformat() if date_to else None
+    return start, end
+
+@router.get("/questions", dependencies=[Depends(require_admin_token)])
+async def list_questions(
+    status: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Постраничный список вопросов (новые сначала)"""
+    after = decode_cursor(cursor)
+    start, end = date_range(date_from, date_to)
+    
+    try:
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+        questions = await db.list_questions(status, start, end, after, limit + 1)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении списка вопросов: {str(e)}"
+        )
+    
+    return build_page(questions, limit)
+
+@router.get("/feedbacks", dependencies=[Depends(require_admin_token)])
+async def list_feedbacks(
+    status: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Постраничный список отзывов (новые сначала)"""
+    after = decode_cursor(cursor)
+    start, end = date_range(date_from, date_to)
+    
+    try:
+        feedbacks = await db.list_feedbacks(status, start, end, after, limit + 1)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении списка отзывов: {str(e)}"
+        )
+    
+    return build_page(feedbacks, limit)
+
+@router.get("/search", dependencies=[Depends(require_admin_token)])
+async def search(
+    q: str = Query(..., min_length=1),
+    kind: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Полнотекстовый поиск по вопросам, ответам и отзывам"""
+    try:
+        results = await db.search(q, kinds=kind, limit=limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при поиске: {str(e)}"
+        )
+    
+    return {"items": [result._asdict() for result in results]}
+
+@router.get("/stats", dependencies=[Depends(require_admin_token)])
+async def get_stats(days: int = Query(7, ge=1, le=366)):
+    """Статистика по вопросам, отзывам, ответам и скорости реакции (SLA)"""
+    try:
+        stats = await db.get_stats(days)
+        stats['sla'] = await db.get_sla_stats(days)
+        return stats
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении статистики: {str(e)}"
+        )
+
 # Добавляем экспорт router
 api_router = router
\ No newline at end of file
@@ -1,6 +1,11 @@
 import logging, asyncio
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from config import Config
+from database.provider import init_database
+from utils.maintenance import run_retention, run_backups
+from utils.rate_limiter import BotRateLimiter
+from utils.outbox import run_outbox_workers, run_digest, flush_digest
+from utils.routing import run_routing_escalation
 
 # Импорты обработчиков пользователей
 from handlers.user_handlers import (
@@ -14,8 +19,13 @@ from handlers.user_handlers import (
 # Импорты обработчиков модераторов
 from handlers.moderator_handlers import (
     add_moderator, 
+    backup_database,
+    vacuum_database,
     show_statistics,
-    get_answer_conversation_handler
+    get_answer_conversation_handler,
+    run_claim_sweeper,
+    search_command,
+    list_deliveries
 )
 
 # Импорты общих обработчиков
@@ -35,7 +45,11 @@ def setup_handlers(application):
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("cancel", cancel_operation))
     application.add_handler(CommandHandler("moderator", add_moderator))
+    application.add_handler(CommandHandler("backup", backup_database))
+    application.add_handler(CommandHandler("vacuum", vacuum_database))
     application.add_handler(CommandHandler("stats", show_statistics))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("deliveries", list_deliveries))
     
     # Обработчики выбора действия пользователя
     application.add_handler(MessageHandler(
@@ -68,8 +82,12 @@ async def start_bot():
         print("❌ Ошибка: BOT_TOKEN не найден в переменных окружения!")
         return
     
+    # Общее хранилище (если еще не создано в main.py)
+    db = init_database()
+    
     # Создание приложения
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    # Все запросы бота из обработчиков проходят через общий ограничитель отправок
+    application = Application.builder().token(Config.BOT_TOKEN).rate_limiter(BotRateLimiter()).build()
     
     # Настройка обработчиков
     setup_handlers(application)
@@ -78,11 +96,27 @@ async def start_bot():
     print("🤖 Бот запущен...")
     print("⏹️  Для остановки нажмите Ctrl+C")
     
+    # Фоновые задачи, живущие вместе с ботом
+    background_tasks = []
+    
     try:
         await application.initialize()
         await application.start()
         await application.updater.start_polling()
         
+        background_tasks.append(asyncio.create_task(run_claim_sweeper()))
+        background_tasks.append(asyncio.create_task(db.run_write_behind()))
+        background_tasks.append(asyncio.create_task(run_retention(db)))
+        background_tasks.append(asyncio.create_task(run_backups(db)))
+        
+        # Воркеры очереди уведомлений модераторам и отправка дайджестов
+        background_tasks.append(asyncio.create_task(run_outbox_workers(db)))
+        background_tasks.append(asyncio.create_task(run_digest(db)))
+        
+        # Эскалация невзятых вопросов, если вопросы назначаются одному модератору
+        if Config.ROUTING_MODE != 'broadcast':
+            background_tasks.append(asyncio.create_task(run_routing_escalation(db)))
+        
         # Бесконечный цикл для поддержания работы бота
         while True:
             await asyncio.sleep(3600)  # Спим 1 час
@@ -95,6 +129,19 @@ async def start_bot():
         await application.shutdown()
     except Exception as e:
         print(f"❌ Ошибка при запуске бота: {e}")
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        
+        # Отправляем накопленный дайджест, пока HTTP-сессия еще открыта
+        try:
+            await flush_digest(db)
+        except Exception as e:
+            print(f"❌ Ошибка отправки дайджеста: {e}")
+        
+        # Сбрасываем отложенные записи перед остановкой
+        await db.flush_writes()
 
 def main():
     """Старая функция запуска для обратной совместимости"""
@@ -8,8 +8,22 @@ class Config:
     BOT_TOKEN = os.getenv('BOT_TOKEN')
     
     # Настройки базы данных
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')  # sqlite или memory
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'feedback_bot.db')
     
+    # Пул соединений SQLite (один писатель + N читателей)
+    DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 4))
+    DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 128))
+    
+    # Отложенная пакетная запись пользователей и отзывов
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', '0') == '1'
+    WRITE_BEHIND_FLUSH_MS = int(os.getenv('WRITE_BEHIND_FLUSH_MS', 200))
+    WRITE_BEHIND_MAX_BATCH = int(os.getenv('WRITE_BEHIND_MAX_BATCH', 100))
+    
+    # Размер LRU-кэша уже сохраненных пользователей
+    SEEN_USERS_CACHE_SIZE = int(os.getenv('SEEN_USERS_CACHE_SIZE', 10000))
+    
     # ID администраторов (через запятую в .env)
     ADMIN_IDS = [int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x]
     
@@ -17,6 +31,79 @@ class Config:
     MAX_PHOTOS_PER_QUESTION = 3
     FEEDBACK_COOLDOWN_MINUTES = 5
     
+    # Срок захвата вопроса модератором и период проверки истекших захватов
+    QUESTION_CLAIM_LEASE_MINUTES = int(os.getenv('QUESTION_CLAIM_LEASE_MINUTES', 30))
+    CLAIM_SWEEP_INTERVAL_SECONDS = int(os.getenv('CLAIM_SWEEP_INTERVAL_SECONDS', 60))
+    
+    # Время жизни кэша активных модераторов
+    MODERATOR_CACHE_TTL_SECONDS = int(os.getenv('MODERATOR_CACHE_TTL_SECONDS', 300))
+    
+    # Количество результатов поиска в команде /search
+    SEARCH_RESULTS_LIMIT = 10
+    
+    # Папка с фотографиями вопросов с сайта
+    PHOTOS_DIR = os.getenv('PHOTOS_DIR', os.path.join('uploads', 'photos'))
+    # Временные папки фото (staging-*), не перенесенные в папку вопроса за это время,
+    # удаляются при архивации (процесс упал между сохранением фото и созданием вопроса)
+    PHOTO_STAGING_MAX_AGE_HOURS = int(os.getenv('PHOTO_STAGING_MAX_AGE_HOURS', 1))
+    
+    # Архивация: закрытые вопросы и отзывы старше RETENTION_DAYS переносятся в архивную БД
+    ARCHIVE_DATABASE_PATH = os.getenv('ARCHIVE_DATABASE_PATH', 'feedback_bot_archive.db')
+    RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', 180))
+    RETENTION_INTERVAL_HOURS = int(os.getenv('RETENTION_INTERVAL_HOURS', 24))
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 500))
+    VACUUM_PAGES_PER_RUN = int(os.getenv('VACUUM_PAGES_PER_RUN', 1000))
+    
+    # Резервные копии БД (онлайн-бэкап SQLite порциями страниц)
+    BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+    BACKUP_INTERVAL_HOURS = int(os.getenv('BACKUP_INTERVAL_HOURS', 24))
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 7))
+    BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', 100))
+    BACKUP_STEP_SLEEP_MS = int(os.getenv('BACKUP_STEP_SLEEP_MS', 10))
+    
+    # Максимум одновременных отправок при рассылке модераторам
+    NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', 10))
+    
+    # Дайджест: больше DIGEST_THRESHOLD_PER_MINUTE новых вопросов в минуту (0 — выключено)
+    # уведомления собираются и отправляются раз в DIGEST_INTERVAL_SECONDS одним сообщением
+    # (интервал должен быть меньше OUTBOX_LEASE_SECONDS: задачи ждут дайджест захваченными)
+    DIGEST_THRESHOLD_PER_MINUTE = int(os.getenv('DIGEST_THRESHOLD_PER_MINUTE', 20))
+    DIGEST_INTERVAL_SECONDS = int(os.getenv('DIGEST_INTERVAL_SECONDS', 60))
+    DIGEST_TEXT_LENGTH = int(os.getenv('DIGEST_TEXT_LENGTH', 80))
+    
+    # Маршрутизация новых вопросов: broadcast (всем модераторам), round_robin,
+    # least_loaded (меньше всего вопросов в работе) или sticky (тому, кто вел прошлый вопрос пользователя)
+    ROUTING_MODE = os.getenv('ROUTING_MODE', 'broadcast')
+    # Через сколько минут невзятый назначенный вопрос передается следующему модератору
+    ROUTING_ESCALATION_MINUTES = int(os.getenv('ROUTING_ESCALATION_MINUTES', 10))
+    ROUTING_SWEEP_INTERVAL_SECONDS = int(os.getenv('ROUTING_SWEEP_INTERVAL_SECONDS', 60))
+    
+    # Задержка, за которую частые смены статуса вопроса сливаются в одно редактирование
+    NOTIFICATION_EDIT_DELAY_MS = int(os.getenv('NOTIFICATION_EDIT_DELAY_MS', 1500))
+    
+    # Лимиты Telegram: сообщений в секунду всего и в один чат, повторы при 429
+    TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+    TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', 1))
+    TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+    
+    # Очередь уведомлений: число воркеров, опрос, срок захвата задачи и повторы
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 2))
+    OUTBOX_POLL_SECONDS = int(os.getenv('OUTBOX_POLL_SECONDS', 5))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 300))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_BASE_BACKOFF_SECONDS = int(os.getenv('OUTBOX_BASE_BACKOFF_SECONDS', 5))
+    OUTBOX_MAX_BACKOFF_SECONDS = int(os.getenv('OUTBOX_MAX_BACKOFF_SECONDS', 600))
+    DELIVERIES_LIST_LIMIT = int(os.getenv('DELIVERIES_LIST_LIMIT', 20))
+    # Окончательно неудачные задачи хранятся для /deliveries столько дней, затем удаляются
+    OUTBOX_FAILED_RETENTION_DAYS = int(os.getenv('OUTBOX_FAILED_RETENTION_DAYS', 14))
+    
+    # HTTP-сессия для прямых вызовов Bot API
+    HTTP_CONNECTION_LIMIT = int(os.getenv('HTTP_CONNECTION_LIMIT', 20))
+    HTTP_KEEPALIVE_SECONDS = int(os.getenv('HTTP_KEEPALIVE_SECONDS', 60))
+    HTTP_TIMEOUT_SECONDS = int(os.getenv('HTTP_TIMEOUT_SECONDS', 60))
+    
     # Настройки FastAPI
     API_HOST = os.getenv('API_HOST', '0.0.0.0')
-    API_PORT = int(os.getenv('API_PORT', 8000))
\ No newline at end of file
+    API_PORT = int(os.getenv('API_PORT', 8000))
+    # Ключ для административных эндпоинтов API (заголовок X-API-Key); пустой — эндпоинты закрыты
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
\ No newline at end of file
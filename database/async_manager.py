@@ -0,0 +1,105 @@
+import asyncio
+import functools
+from collections import OrderedDict
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database.manager import DatabaseManager
+from database.write_behind import WriteBehindQueue
+
+class SeenUsersCache:
+    """Ограниченный LRU-кэш уже сохраненных профилей пользователей"""
+    
+    def __init__(self, max_size: int = Config.SEEN_USERS_CACHE_SIZE):
+        self.max_size = max_size
+        self._profiles = OrderedDict()
+    
+    def is_known(self, user_id: int, username: str, first_name: str) -> bool:
+        """True, если пользователь уже сохранен с таким же профилем"""
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            return False
+        self._profiles.move_to_end(user_id)
+        return profile == (username, first_name)
+    
+    def remember(self, user_id: int, username: str, first_name: str):
+        self._profiles[user_id] = (username, first_name)
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+class AsyncDatabaseManager:
+    """
+    Асинхронная обертка над DatabaseManager.
+    Каждый вызов выполняется в отдельном потоке БД, поэтому медленная запись
+    или fsync не блокирует event loop бота и FastAPI.
+    Поддерживает те же методы, что и DatabaseManager, но их нужно вызывать через await.
+    """
+    
+    def __init__(self, db_path: str = Config.DATABASE_PATH, manager: DatabaseManager = None,
+                 write_behind: bool = Config.WRITE_BEHIND_ENABLED):
+        self.sync = manager or DatabaseManager(db_path)
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.DB_READ_POOL_SIZE + 1,
+            thread_name_prefix='db'
+        )
+        # Очередь отложенной записи для пользователей и отзывов (если включена)
+        self.write_behind = WriteBehindQueue(self) if write_behind else None
+        self.seen_users = SeenUsersCache()
+    
+    async def run(self, func, *args, **kwargs):
+        """Выполнение синхронной функции в потоке БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def __getattr__(self, name):
+        attr = getattr(self.sync, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+        
+        return wrapper
+    
+    async def add_user(self, user_id: int, username: str, first_name: str):
+        """
+        Добавление/обновление пользователя (через очередь, если включена).
+        БД не затрагивается, если пользователь уже сохранен с тем же профилем.
+        """
+        if self.seen_users.is_known(user_id, username, first_name):
+            return
+        
+        if self.write_behind is not None:
+            self.write_behind.add_user(user_id, username, first_name)
+        else:
+            await self.run(self.sync.add_user, user_id, username, first_name)
+        
+        self.seen_users.remember(user_id, username, first_name)
+    
+    async def add_feedback(self, user_id: int, text: str) -> Optional[int]:
+        """
+        Добавление отзыва. В режиме отложенной записи возвращает None,
+        так как ID отзыва появится только после сброса очереди.
+        """
+        if self.write_behind is not None:
+            self.write_behind.add_feedback(user_id, text)
+            return None
+        return await self.run(self.sync.add_feedback, user_id, text)
+    
+    async def run_write_behind(self):
+        """Фоновая задача сброса очереди отложенной записи"""
+        if self.write_behind is not None:
+            await self.write_behind.run()
+    
+    async def flush_writes(self):
+        """Принудительный сброс очереди отложенной записи"""
+        if self.write_behind is not None:
+            await self.write_behind.flush()
+    
+    async def close(self):
+        """Остановка потоков БД и закрытие соединений"""
+        await self.flush_writes()
+        self._executor.shutdown(wait=True)
+        self.sync.close()
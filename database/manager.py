@@ -1,16 +1,51 @@
-import sqlite3
+import json
+import os
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from config import Config
+from database.pool import ConnectionPool
+from database.storage import Storage
+from database.migrations import apply_migrations
+from database.sketch import bucket_for, summarize
+from database.models import (
+    User, Moderator, Feedback, Question, QuestionPhoto, Answer, QuestionDetail, SearchResult, OutboxJob,
+    OutboxEntry, ModeratorMessage, record_factory
+)
 
-class DatabaseManager:
-    def __init__(self, db_path: str = Config.DATABASE_PATH):
+# Выборка вопроса; порядок колонок совпадает с полями models.Question
+QUESTION_SELECT = '''
+    SELECT q.id, q.user_id, q.text, q.status, q.moderator_id, q.created_at, q.claimed_at,
+           u.username, u.first_name, m.username
+    FROM questions q
+    LEFT JOIN users u ON q.user_id = u.user_id
+    LEFT JOIN moderators m ON q.moderator_id = m.user_id
+'''
+
+def build_fts_query(terms: str) -> str:
+    """
+    Безопасный запрос FTS5 из пользовательского ввода: каждое слово берется
+    в кавычки (чтобы не интерпретировать синтаксис FTS) и ищется по префиксу.
+    """
+    words = [word.replace('"', '""') for word in terms.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+class DatabaseManager(Storage):
+    """Хранилище на SQLite-файле"""
+    
+    def __init__(self, db_path: str = Config.DATABASE_PATH,
+                 archive_path: str = Config.ARCHIVE_DATABASE_PATH):
         self.db_path = db_path
+        self.archive_path = archive_path
+        self._pool = ConnectionPool(db_path)
         self.init_database()
     
+    def close(self):
+        """Закрытие соединений с базой данных"""
+        self._pool.close()
+    
     def init_database(self):
-        """Инициализация таблиц в базе данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Инициализация таблиц и применение миграций схемы"""
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             
             # Таблица пользователей
@@ -85,54 +120,108 @@ class DatabaseManager:
                 )
             ''')
             
-            conn.commit()
+            # Версионированные миграции поверх базовой схемы
+            apply_migrations(conn)
     
     def add_user(self, user_id: int, username: str, first_name: str):
         """Добавление/обновление пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT OR REPLACE INTO users (user_id, username, first_name)
+                INSERT INTO users (user_id, username, first_name)
                 VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name
+                WHERE username IS NOT excluded.username OR first_name IS NOT excluded.first_name
             ''', (user_id, username, first_name))
-            conn.commit()
     
     def add_feedback(self, user_id: int, text: str) -> int:
         """Добавление отзыва в базу"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO feedbacks (user_id, text)
                 VALUES (?, ?)
             ''', (user_id, text))
-            conn.commit()
             return cursor.lastrowid
     
+    def apply_write_batch(self, users: List[tuple], feedbacks: List[tuple]):
+        """
+        Пакетная запись пользователей и отзывов одной транзакцией.
+        users — кортежи (user_id, username, first_name),
+        feedbacks — кортежи (user_id, text, created_at).
+        """
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
+            if users:
+                cursor.executemany('''
+                    INSERT INTO users (user_id, username, first_name)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        username = excluded.username,
+                        first_name = excluded.first_name
+                    WHERE username IS NOT excluded.username OR first_name IS NOT excluded.first_name
+                ''', users)
+            if feedbacks:
+                cursor.executemany('''
+                    INSERT INTO feedbacks (user_id, text, created_at)
+                    VALUES (?, ?, ?)
+                ''', feedbacks)
+    
     def add_question(self, user_id: int, text: str) -> int:
         """Добавление вопроса в базу"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO questions (user_id, text)
                 VALUES (?, ?)
             ''', (user_id, text))
-            conn.commit()
             return cursor.lastrowid
     
+    def create_question(self, user_id: int, text: str, photos: List[Tuple[str, str]] = (),
+                        payload: Optional[dict] = None, prepare_payload=None) -> int:
+        """
+        Добавление вопроса вместе с фотографиями (file_id, file_unique_id) и задачей
+        уведомления модераторов (payload) в одной транзакции.
+        prepare_payload(question_id) -> dict вызывается внутри транзакции и дополняет задачу
+        (например, переносит заранее сохраненные фото с сайта в папку вопроса до того,
+        как задачу увидят воркеры). Она выполняется под блокировкой записи, поэтому
+        не должна декодировать или записывать файлы - только быстро их переименовывать.
+        """
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO questions (user_id, text)
+                VALUES (?, ?)
+            ''', (user_id, text))
+            question_id = cursor.lastrowid
+            
+            cursor.executemany('''
+                INSERT INTO question_photos (question_id, file_id, file_unique_id)
+                VALUES (?, ?, ?)
+            ''', [(question_id, file_id, file_unique_id) for file_id, file_unique_id in photos])
+            
+            payload = dict(payload or {})
+            if prepare_payload:
+                payload.update(prepare_payload(question_id))
+            self._enqueue_notification(cursor, 'new_question', question_id, payload)
+            return question_id
+    
     def add_question_photo(self, question_id: int, file_id: str, file_unique_id: str):
         """Добавление фотографии к вопросу"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO question_photos (question_id, file_id, file_unique_id)
                 VALUES (?, ?, ?)
             ''', (question_id, file_id, file_unique_id))
-            conn.commit()
     
-    def get_active_moderators(self) -> List[tuple]:
+    def get_active_moderators(self) -> List[Moderator]:
         """Получение списка активных модераторов"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = record_factory(Moderator)
             cursor.execute('''
                 SELECT user_id, username, first_name 
                 FROM moderators 
@@ -142,60 +231,110 @@ class DatabaseManager:
     
     def add_moderator(self, user_id: int, username: str, first_name: str):
         """Добавление модератора"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO moderators (user_id, username, first_name)
                 VALUES (?, ?, ?)
             ''', (user_id, username, first_name))
-            conn.commit()
     
-    def get_question(self, question_id: int) -> Optional[tuple]:
-        """Получение вопроса по ID"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Получение пользователя по ID"""
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = record_factory(User)
             cursor.execute('''
-                SELECT q.*, u.user_id, u.username, u.first_name 
-                FROM questions q
-                JOIN users u ON q.user_id = u.user_id
-                WHERE q.id = ?
-            ''', (question_id,))
+                SELECT user_id, username, first_name, created_at
+                FROM users
+                WHERE user_id = ?
+            ''', (user_id,))
             return cursor.fetchone()
     
-    def get_question_photos(self, question_id: int) -> List[tuple]:
+    def get_question(self, question_id: int) -> Optional[Question]:
+        """Получение вопроса по ID"""
+        with self._pool.reader() as conn:
+            return self._fetch_question(conn, question_id)
+    
+    def _fetch_question(self, conn, question_id: int) -> Optional[Question]:
+        cursor = conn.cursor()
+        cursor.row_factory = record_factory(Question)
+        cursor.execute(QUESTION_SELECT + ' WHERE q.id = ?', (question_id,))
+        return cursor.fetchone()
+    
+    def get_question_photos(self, question_id: int) -> List[QuestionPhoto]:
         """Получение фотографий вопроса"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT file_id, file_unique_id 
-                FROM question_photos 
-                WHERE question_id = ?
-            ''', (question_id,))
-            return cursor.fetchall()
+        with self._pool.reader() as conn:
+            return self._fetch_question_photos(conn, question_id)
+    
+    def _fetch_question_photos(self, conn, question_id: int) -> List[QuestionPhoto]:
+        cursor = conn.cursor()
+        cursor.row_factory = record_factory(QuestionPhoto)
+        cursor.execute('''
+            SELECT file_id, file_unique_id 
+            FROM question_photos 
+            WHERE question_id = ?
+            ORDER BY id ASC
+        ''', (question_id,))
+        return cursor.fetchall()
     
     def update_question_status(self, question_id: int, status: str):
         """Обновление статуса вопроса"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE questions SET status = ? WHERE id = ?
             ''', (status, question_id))
-            conn.commit()
     
     def add_answer(self, question_id: int, moderator_id: int, answer_text: str) -> int:
         """Добавление ответа на вопрос"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
+            return self._insert_answer(conn.cursor(), question_id, moderator_id, answer_text)
+    
+    def _insert_answer(self, cursor, question_id: int, moderator_id: int, answer_text: str) -> int:
+        cursor.execute('''
+            INSERT INTO answers (question_id, moderator_id, answer_text)
+            VALUES (?, ?, ?)
+        ''', (question_id, moderator_id, answer_text))
+        answer_id = cursor.lastrowid
+        
+        cursor.execute('''
+            SELECT (julianday('now') - julianday(created_at)) * 86400
+            FROM questions WHERE id = ?
+        ''', (question_id,))
+        result = cursor.fetchone()
+        if result:
+            self._record_sla(cursor, 'answer', moderator_id, result[0])
+        return answer_id
+    
+    def queue_answer_delivery(self, question_id: int, moderator_id: int, answer_text: str,
+                              user_id: int, message_text: str, error: str) -> int:
+        """
+        Сохранение ответа, который не удалось доставить пользователю:
+        вопрос помечается 'error', а отправка ставится в очередь повторов (одной транзакцией).
+        """
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO answers (question_id, moderator_id, answer_text)
-                VALUES (?, ?, ?)
-            ''', (question_id, moderator_id, answer_text))
-            conn.commit()
-            return cursor.lastrowid
+            answer_id = self._insert_answer(cursor, question_id, moderator_id, answer_text)
+            cursor.execute("UPDATE questions SET status = 'error' WHERE id = ?", (question_id,))
+            self._enqueue_notification(
+                cursor, 'answer_delivery', question_id,
+                {'answer_id': answer_id, 'user_id': user_id, 'text': message_text},
+                delay_seconds=Config.OUTBOX_BASE_BACKOFF_SECONDS,
+                last_error=error
+            )
+            return answer_id
+    
+    def _record_sla(self, cursor, metric: str, moderator_id: Optional[int], seconds: float):
+        """Добавление наблюдения в гистограмму SLA за текущий день"""
+        cursor.execute('''
+            INSERT INTO sla_buckets (metric, day, moderator_id, bucket, count)
+            VALUES (?, date('now'), ?, ?, 1)
+            ON CONFLICT (metric, day, moderator_id, bucket) DO UPDATE SET count = count + 1
+        ''', (metric, moderator_id or 0, bucket_for(seconds or 0)))
     
     def is_question_answered(self, question_id: int) -> bool:
         """Проверка, отвечен ли вопрос"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT status FROM questions WHERE id = ?
@@ -205,7 +344,7 @@ class DatabaseManager:
     
     def get_question_status(self, question_id: int) -> Optional[str]:
         """Получение статуса вопроса"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT status FROM questions WHERE id = ?
@@ -216,46 +355,58 @@ class DatabaseManager:
     def set_question_in_progress(self, question_id: int, moderator_id: int) -> bool:
         """
         Устанавливает вопрос "в работе" указанным модератором.
+        Захват выполняется одним условным UPDATE, время захвата сохраняется в claimed_at.
         Возвращает True если блокировка успешна, False если вопрос уже взят другим модератором.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
-            
-            # Проверяем, не взят ли вопрос уже другим модератором
-            cursor.execute('''
-                SELECT moderator_id FROM questions WHERE id = ? AND (status = 'new' OR status = 'in_progress')
-            ''', (question_id,))
-            result = cursor.fetchone()
-            
-            if result and result[0] is not None:
-                # Вопрос уже взят другим модератором
-                return False
-            
-            # Блокируем вопрос за текущим модератором
             cursor.execute('''
                 UPDATE questions 
-                SET status = 'in_progress', moderator_id = ? 
-                WHERE id = ? AND (status = 'new' OR status = 'in_progress')
+                SET status = 'in_progress', moderator_id = ?, claimed_at = CURRENT_TIMESTAMP,
+                    first_claimed_at = COALESCE(first_claimed_at, CURRENT_TIMESTAMP),
+                    claim_count = claim_count + 1
+                WHERE id = ? AND (status = 'new' OR status = 'in_progress') AND moderator_id IS NULL
+                RETURNING (julianday(claimed_at) - julianday(created_at)) * 86400, claim_count = 1
             ''', (moderator_id, question_id))
+            result = cursor.fetchone()
+            if result is None:
+                return False
             
-            conn.commit()
-            return cursor.rowcount > 0
+            # Время до захвата учитываем только для первого захвата вопроса
+            seconds_to_claim, is_first_claim = result
+            if is_first_claim:
+                self._record_sla(cursor, 'claim', moderator_id, seconds_to_claim)
+            return True
     
     def release_question_lock(self, question_id: int) -> bool:
-        """Освобождает блокировку вопроса"""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Освобождает блокировку вопроса.
+        Срок назначения отсчитывается заново, чтобы возвращенный вопрос
+        не эскалировался сразу по старому assigned_at.
+        """
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE questions 
-                SET status = 'new', moderator_id = NULL 
+                SET status = 'new', moderator_id = NULL, claimed_at = NULL,
+                    assigned_at = CASE WHEN assigned_to IS NULL THEN NULL ELSE CURRENT_TIMESTAMP END
                 WHERE id = ? AND status = 'in_progress'
             ''', (question_id,))
-            conn.commit()
             return cursor.rowcount > 0
     
+    def get_expired_claims(self, lease_seconds: int) -> List[int]:
+        """Получает ID вопросов, срок захвата которых истек"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id FROM questions
+                WHERE status = 'in_progress' AND claimed_at <= datetime('now', ?)
+            ''', (f'-{int(lease_seconds)} seconds',))
+            return [row[0] for row in cursor.fetchall()]
+    
     def get_question_moderator(self, question_id: int) -> Optional[int]:
         """Получает ID модератора, который взял вопрос в работу"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT moderator_id FROM questions WHERE id = ?
@@ -263,51 +414,592 @@ class DatabaseManager:
             result = cursor.fetchone()
             return result[0] if result else None
     
-    def get_new_questions(self) -> List[tuple]:
-        """Получает список новых вопросов (статус 'new')"""
-        with sqlite3.connect(self.db_path) as conn:
+    def assign_question(self, question_id: int, moderator_id: int):
+        """Назначение нового вопроса модератору"""
+        with self._pool.writer() as conn:
+            conn.execute('''
+                UPDATE questions SET assigned_to = ?, assigned_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (moderator_id, question_id))
+    
+    def get_last_assigned_moderator(self) -> Optional[int]:
+        """Модератор, которому был назначен последний вопрос (для распределения по кругу)"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT assigned_to FROM questions
+                WHERE assigned_at IS NOT NULL
+                ORDER BY assigned_at DESC, id DESC
+                LIMIT 1
+            ''')
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def get_user_last_moderator(self, user_id: int, before_question_id: int) -> Optional[int]:
+        """Модератор, который вел предыдущий вопрос пользователя"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(moderator_id, assigned_to) FROM questions
+                WHERE user_id = ? AND id < ? AND COALESCE(moderator_id, assigned_to) IS NOT NULL
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (user_id, before_question_id))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def get_moderator_loads(self) -> Dict[int, int]:
+        """Число вопросов на каждом модераторе: взятые в работу и назначенные, но еще не взятые"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(moderator_id, assigned_to), COUNT(*) FROM questions
+                WHERE (status = 'in_progress' AND moderator_id IS NOT NULL)
+                   OR (status = 'new' AND assigned_to IS NOT NULL)
+                GROUP BY 1
+            ''')
+            return dict(cursor.fetchall())
+    
+    def get_unclaimed_assignments(self, timeout_seconds: int) -> List[Tuple[int, int, int]]:
+        """Назначенные вопросы, которые не взяли за timeout_seconds: (question_id, assigned_to, escalations)"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, assigned_to, escalations FROM questions
+                WHERE status = 'new' AND assigned_to IS NOT NULL AND assigned_at <= datetime('now', ?)
+                ORDER BY id
+            ''', (f'-{int(timeout_seconds)} seconds',))
+            return cursor.fetchall()
+    
+    def escalate_question(self, question_id: int, moderator_ids: List[int], reassign_to: Optional[int]) -> bool:
+        """
+        Эскалация невзятого вопроса: назначение reassign_to (None — назначение снимается)
+        и постановка уведомления moderator_ids (если они есть) в очередь одной транзакцией.
+        Возвращает False, если вопрос тем временем взяли.
+        """
+        with self._pool.writer() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT q.*, u.username, u.first_name 
-                FROM questions q
-                JOIN users u ON q.user_id = u.user_id
+                UPDATE questions
+                SET assigned_to = ?,
+                    assigned_at = CASE WHEN ? IS NULL THEN NULL ELSE CURRENT_TIMESTAMP END,
+                    escalations = escalations + 1
+                WHERE id = ? AND status = 'new' AND assigned_to IS NOT NULL
+            ''', (reassign_to, reassign_to, question_id))
+            if cursor.rowcount == 0:
+                return False
+            if moderator_ids:
+                self._enqueue_notification(cursor, 'new_question', question_id, {'targets': moderator_ids})
+            return True
+    
+    def get_new_questions(self) -> List[Question]:
+        """Получает список новых вопросов (статус 'new')"""
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(Question)
+            cursor.execute(QUESTION_SELECT + '''
                 WHERE q.status = 'new'
                 ORDER BY q.created_at ASC
             ''')
             return cursor.fetchall()
     
-    def get_in_progress_questions(self) -> List[tuple]:
+    def get_in_progress_questions(self) -> List[Question]:
         """Получает список вопросов в работе"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT q.*, u.username, u.first_name, m.username as moderator_username
-                FROM questions q
-                JOIN users u ON q.user_id = u.user_id
-                LEFT JOIN moderators m ON q.moderator_id = m.user_id
+            cursor.row_factory = record_factory(Question)
+            cursor.execute(QUESTION_SELECT + '''
                 WHERE q.status = 'in_progress'
                 ORDER BY q.created_at ASC
             ''')
             return cursor.fetchall()
     
-    def get_question_answers(self, question_id: int) -> List[dict]:
-        """Получение ответов на вопрос"""
-        with sqlite3.connect(self.db_path) as conn:
+    def list_questions(self, status: Optional[str] = None, date_from: Optional[str] = None,
+                       date_to: Optional[str] = None, after: Optional[Tuple[str, int]] = None,
+                       limit: int = 50) -> List[Question]:
+        """
+        Постраничная выборка вопросов (новые сначала).
+        after — ключ (created_at, id) последней записи предыдущей страницы.
+        """
+        with self._pool.reader() as conn:
+            return self._fetch_page(
+                conn, Question, QUESTION_SELECT, 'q', status, date_from, date_to, after, limit
+            )
+    
+    def list_feedbacks(self, status: Optional[str] = None, date_from: Optional[str] = None,
+                       date_to: Optional[str] = None, after: Optional[Tuple[str, int]] = None,
+                       limit: int = 50) -> List[Feedback]:
+        """
+        Постраничная выборка отзывов (новые сначала).
+        after — ключ (created_at, id) последней записи предыдущей страницы.
+        """
+        select = '''
+            SELECT f.id, f.user_id, f.text, f.status, f.created_at
+            FROM feedbacks f
+        '''
+        with self._pool.reader() as conn:
+            return self._fetch_page(
+                conn, Feedback, select, 'f', status, date_from, date_to, after, limit
+            )
+    
+    def _fetch_page(self, conn, record_type, select: str, alias: str, status: Optional[str],
+                    date_from: Optional[str], date_to: Optional[str],
+                    after: Optional[Tuple[str, int]], limit: int) -> list:
+        """
+        Keyset-пагинация по (created_at, id): стоимость страницы не зависит от ее номера,
+        так как выборка начинается с поиска по индексу, а не с пропуска OFFSET строк.
+        date_from включительно, date_to не включительно.
+        """
+        conditions = []
+        params = []
+        
+        if status:
+            conditions.append(f'{alias}.status = ?')
+            params.append(status)
+        if date_from:
+            conditions.append(f'{alias}.created_at >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append(f'{alias}.created_at < ?')
+            params.append(date_to)
+        if after:
+            after_created_at, after_id = after
+            conditions.append(
+                f'{alias}.created_at <= ? AND ({alias}.created_at < ? OR {alias}.id < ?)'
+            )
+            params.extend([after_created_at, after_created_at, after_id])
+        
+        sql = select
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT ?'
+        params.append(limit)
+        
+        cursor = conn.cursor()
+        cursor.row_factory = record_factory(record_type)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    
+    def search(self, terms: str, kinds: Optional[List[str]] = None, limit: int = 20) -> List[SearchResult]:
+        """
+        Полнотекстовый поиск по вопросам, ответам и отзывам (FTS5).
+        Результаты отсортированы по релевантности (bm25).
+        """
+        query = build_fts_query(terms)
+        if not query:
+            return []
+        
+        sources = {
+            'question': '''
+                SELECT 'question', q.id, q.id,
+                       snippet(questions_fts, 0, '«', '»', '…', 12), q.created_at, bm25(questions_fts)
+                FROM questions_fts
+                JOIN questions q ON q.id = questions_fts.rowid
+                WHERE questions_fts MATCH ?
+            ''',
+            'answer': '''
+                SELECT 'answer', a.id, a.question_id,
+                       snippet(answers_fts, 0, '«', '»', '…', 12), a.created_at, bm25(answers_fts)
+                FROM answers_fts
+                JOIN answers a ON a.id = answers_fts.rowid
+                WHERE answers_fts MATCH ?
+            ''',
+            'feedback': '''
+                SELECT 'feedback', f.id, NULL,
+                       snippet(feedbacks_fts, 0, '«', '»', '…', 12), f.created_at, bm25(feedbacks_fts)
+                FROM feedbacks_fts
+                JOIN feedbacks f ON f.id = feedbacks_fts.rowid
+                WHERE feedbacks_fts MATCH ?
+            ''',
+        }
+        selected = [kind for kind in sources if not kinds or kind in kinds]
+        if not selected:
+            return []
+        
+        sql = ' UNION ALL '.join(sources[kind] for kind in selected) + ' ORDER BY 6 LIMIT ?'
+        params = [query] * len(selected) + [limit]
+        
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(SearchResult)
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    
+    def get_stats(self, days: int = 7) -> Dict[str, Any]:
+        """
+        Статистика из инкрементальных счетчиков (без COUNT(*) по таблицам).
+        Дневные значения возвращаются за последние days дней.
+        """
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT metric, dimension, key, value
+                FROM stats_counters
+                WHERE dimension != 'day' OR key >= date('now', ?)
+            ''', (f'-{max(int(days) - 1, 0)} days',))
+            rows = cursor.fetchall()
+        
+        stats = {}
+        for metric in ('questions', 'feedbacks', 'answers'):
+            stats[metric] = {'total': 0, 'by_status': {}, 'by_day': {}, 'by_moderator': {}}
+        
+        for metric, dimension, key, value in rows:
+            section = stats[metric]
+            if dimension == 'total':
+                section['total'] = value
+            else:
+                section[f'by_{dimension}'][key] = value
+        return stats
+    
+    def get_sla_stats(self, days: int = 7) -> Dict[str, Any]:
+        """
+        Перцентили (p50/p90/p99) времени до захвата и до ответа за последние days дней:
+        в целом, по дням и по модераторам. Читаются только гистограммы, без таблицы answers.
+        """
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT metric, day, moderator_id, bucket, count
+                FROM sla_buckets
+                WHERE day >= date('now', ?)
+            ''', (f'-{max(int(days) - 1, 0)} days',))
+            rows = cursor.fetchall()
+        
+        histograms = {}
+        for metric, day, moderator_id, bucket, count in rows:
+            metric_histograms = histograms.setdefault(
+                metric, {'overall': {}, 'by_day': {}, 'by_moderator': {}}
+            )
+            for histogram in (
+                metric_histograms['overall'],
+                metric_histograms['by_day'].setdefault(day, {}),
+                metric_histograms['by_moderator'].setdefault(str(moderator_id), {})
+            ):
+                histogram[bucket] = histogram.get(bucket, 0) + count
+        
+        sla = {}
+        for metric in ('claim', 'answer'):
+            metric_histograms = histograms.get(metric, {'overall': {}, 'by_day': {}, 'by_moderator': {}})
+            sla[metric] = {
+                'overall': summarize(metric_histograms['overall']),
+                'by_day': {
+                    day: summarize(histogram)
+                    for day, histogram in sorted(metric_histograms['by_day'].items())
+                },
+                'by_moderator': {
+                    moderator_id: summarize(histogram)
+                    for moderator_id, histogram in metric_histograms['by_moderator'].items()
+                }
+            }
+        return sla
+    
+    def archive_old_questions(self, older_than_days: int, batch_size: int) -> List[int]:
+        """
+        Переносит одну порцию отвеченных/закрытых вопросов старше older_than_days дней
+        (вместе с ответами и фотографиями) в архивную БД.
+        Возвращает ID перенесенных вопросов.
+        """
+        with self._pool.exclusive() as conn:
+            self._attach_archive(conn)
+            try:
+                with conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id FROM questions
+                        WHERE status IN ('answered', 'closed') AND created_at < datetime('now', ?)
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (f'-{int(older_than_days)} days', batch_size))
+                    question_ids = [row[0] for row in cursor.fetchall()]
+                    if not question_ids:
+                        return []
+                    
+                    placeholders = ','.join('?' * len(question_ids))
+                    
+                    # INSERT OR IGNORE делает перенос идемпотентным при повторном запуске
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.questions
+                            (id, user_id, text, status, moderator_id, created_at, claimed_at, first_claimed_at)
+                        SELECT id, user_id, text, status, moderator_id, created_at, claimed_at, first_claimed_at
+                        FROM main.questions WHERE id IN ({placeholders})
+                    ''', question_ids)
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.answers (id, question_id, moderator_id, answer_text, created_at)
+                        SELECT id, question_id, moderator_id, answer_text, created_at
+                        FROM main.answers WHERE question_id IN ({placeholders})
+                    ''', question_ids)
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.question_photos (id, question_id, file_id, file_unique_id, created_at)
+                        SELECT id, question_id, file_id, file_unique_id, created_at
+                        FROM main.question_photos WHERE question_id IN ({placeholders})
+                    ''', question_ids)
+                    
+                    cursor.execute(f'DELETE FROM main.question_photos WHERE question_id IN ({placeholders})', question_ids)
+                    cursor.execute(f'DELETE FROM main.moderator_messages WHERE question_id IN ({placeholders})', question_ids)
+                    cursor.execute(f'DELETE FROM main.answers WHERE question_id IN ({placeholders})', question_ids)
+                    cursor.execute(f'DELETE FROM main.questions WHERE id IN ({placeholders})', question_ids)
+                    return question_ids
+            finally:
+                conn.execute('DETACH DATABASE archive')
+    
+    def archive_old_feedbacks(self, older_than_days: int, batch_size: int) -> int:
+        """Переносит одну порцию отзывов старше older_than_days дней в архивную БД"""
+        with self._pool.exclusive() as conn:
+            self._attach_archive(conn)
+            try:
+                with conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id FROM feedbacks
+                        WHERE created_at < datetime('now', ?)
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (f'-{int(older_than_days)} days', batch_size))
+                    feedback_ids = [row[0] for row in cursor.fetchall()]
+                    if not feedback_ids:
+                        return 0
+                    
+                    placeholders = ','.join('?' * len(feedback_ids))
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO archive.feedbacks (id, user_id, text, status, created_at)
+                        SELECT id, user_id, text, status, created_at
+                        FROM main.feedbacks WHERE id IN ({placeholders})
+                    ''', feedback_ids)
+                    cursor.execute(f'DELETE FROM main.feedbacks WHERE id IN ({placeholders})', feedback_ids)
+                    return len(feedback_ids)
+            finally:
+                conn.execute('DETACH DATABASE archive')
+    
+    def _attach_archive(self, conn):
+        """Подключение архивной БД и создание в ней таблиц"""
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.questions (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                text TEXT NOT NULL,
+                status TEXT,
+                moderator_id INTEGER,
+                created_at TIMESTAMP,
+                claimed_at TIMESTAMP,
+                first_claimed_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.answers (
+                id INTEGER PRIMARY KEY,
+                question_id INTEGER,
+                moderator_id INTEGER,
+                answer_text TEXT NOT NULL,
+                created_at TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.question_photos (
+                id INTEGER PRIMARY KEY,
+                question_id INTEGER,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT NOT NULL,
+                created_at TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.feedbacks (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                text TEXT NOT NULL,
+                status TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+    
+    def run_maintenance(self, vacuum_pages: int):
+        """
+        Обслуживание БД: возврат до vacuum_pages свободных страниц (incremental vacuum)
+        и обновление статистики планировщика запросов (ANALYZE).
+        Полный VACUUM здесь не выполняется: старый файл БД переводится в режим
+        incremental один раз командой администратора (enable_incremental_vacuum).
+        """
+        with self._pool.exclusive() as conn:
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if auto_vacuum == 2:
+                conn.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+            else:
+                print("⚠️ БД не в режиме incremental auto_vacuum, место не возвращается. Выполните /vacuum")
+            
+            conn.execute('PRAGMA analysis_limit=400')
+            conn.execute('ANALYZE')
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Однократный перевод старого файла БД в режим incremental auto_vacuum.
+        Требует полного VACUUM, который блокирует запись на все время перестройки файла,
+        поэтому запускается только явно администратором.
+        Возвращает False, если режим уже включен.
+        """
+        with self._pool.exclusive() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return False
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            return True
+    
+    def backup(self, target_path: str, pages_per_step: int = Config.BACKUP_PAGES_PER_STEP,
+               step_sleep_ms: int = Config.BACKUP_STEP_SLEEP_MS):
+        """Онлайн-бэкап БД в файл target_path без остановки записи"""
+        self._pool.backup(target_path, pages_per_step, step_sleep_ms)
+    
+    @property
+    def backup_name(self) -> str:
+        """Базовое имя файлов резервных копий: имя файла БД без расширения"""
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+    
+    def save_moderator_messages(self, question_id: int, messages: List[Tuple[int, int, bool]]):
+        """Сохранение message_id уведомлений о вопросе: (moderator_id, message_id, is_caption)"""
+        with self._pool.writer() as conn:
+            conn.executemany('''
+                INSERT INTO moderator_messages (question_id, moderator_id, message_id, is_caption)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (question_id, moderator_id) DO UPDATE SET
+                    message_id = excluded.message_id,
+                    is_caption = excluded.is_caption
+            ''', [(question_id, moderator_id, message_id, int(is_caption))
+                  for moderator_id, message_id, is_caption in messages])
+    
+    def get_moderator_messages(self, question_id: int) -> List[ModeratorMessage]:
+        """Уведомления о вопросе, отправленные модераторам"""
+        with self._pool.reader() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = lambda cursor, row: ModeratorMessage(row[0], row[1], bool(row[2]))
             cursor.execute('''
-                SELECT a.id, a.answer_text, a.created_at, m.first_name as moderator_name
-                FROM answers a
-                LEFT JOIN moderators m ON a.moderator_id = m.user_id
-                WHERE a.question_id = ?
-                ORDER BY a.created_at ASC
+                SELECT moderator_id, message_id, is_caption
+                FROM moderator_messages
+                WHERE question_id = ?
             ''', (question_id,))
+            return cursor.fetchall()
+    
+    def get_question_answers(self, question_id: int) -> List[Answer]:
+        """Получение ответов на вопрос"""
+        with self._pool.reader() as conn:
+            return self._fetch_question_answers(conn, question_id)
+    
+    def _fetch_question_answers(self, conn, question_id: int) -> List[Answer]:
+        cursor = conn.cursor()
+        cursor.row_factory = record_factory(Answer)
+        cursor.execute('''
+            SELECT a.id, a.answer_text, a.created_at, COALESCE(m.first_name, 'Модератор')
+            FROM answers a
+            LEFT JOIN moderators m ON a.moderator_id = m.user_id
+            WHERE a.question_id = ?
+            ORDER BY a.created_at ASC
+        ''', (question_id,))
+        return cursor.fetchall()
+    
+    def get_question_detail(self, question_id: int) -> Optional[QuestionDetail]:
+        """Получение вопроса со статусом, фотографиями и ответами в одной транзакции чтения"""
+        with self._pool.snapshot() as conn:
+            question = self._fetch_question(conn, question_id)
+            if not question:
+                return None
             
-            answers = []
-            for row in cursor.fetchall():
-                answers.append({
-                    'id': row[0],
-                    'text': row[1],
-                    'created_at': row[2],
-                    'moderator_name': row[3] or 'Модератор'
-                })
-            return answers
\ No newline at end of file
+            return QuestionDetail(
+                question=question,
+                photos=self._fetch_question_photos(conn, question_id),
+                answers=self._fetch_question_answers(conn, question_id)
+            )
+    
+    # Очередь исходящих уведомлений
+    
+    def _enqueue_notification(self, cursor, kind: str, question_id: Optional[int], payload: dict,
+                              delay_seconds: int = 0, last_error: Optional[str] = None) -> int:
+        cursor.execute('''
+            INSERT INTO notification_outbox (kind, question_id, payload, next_attempt_at, last_error)
+            VALUES (?, ?, ?, datetime('now', ?), ?)
+        ''', (kind, question_id, json.dumps(payload), f'+{int(delay_seconds)} seconds', last_error))
+        return cursor.lastrowid
+    
+    def enqueue_notification(self, kind: str, question_id: Optional[int], payload: Optional[dict] = None) -> int:
+        """Постановка уведомления в очередь"""
+        with self._pool.writer() as conn:
+            return self._enqueue_notification(conn.cursor(), kind, question_id, payload or {})
+    
+    def claim_notifications(self, limit: int, lease_seconds: int) -> List[OutboxJob]:
+        """
+        Забирает готовые к отправке задачи: ожидающие, у которых подошло время,
+        и зависшие в обработке дольше lease_seconds (воркер упал или процесс перезапущен).
+        """
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notification_outbox
+                SET status = 'processing', locked_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM notification_outbox
+                    WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                       OR (status = 'processing' AND locked_at <= datetime('now', ?))
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id, kind, question_id, payload, attempts
+            ''', (f'-{int(lease_seconds)} seconds', limit))
+            return [
+                OutboxJob(job_id, kind, question_id, json.loads(payload), attempts)
+                for job_id, kind, question_id, payload, attempts in cursor.fetchall()
+            ]
+    
+    def complete_notification(self, job_id: int):
+        """Удаление доставленной задачи"""
+        with self._pool.writer() as conn:
+            conn.execute('DELETE FROM notification_outbox WHERE id = ?', (job_id,))
+    
+    def fail_notification(self, job_id: int, error: str, retry_in_seconds: Optional[float],
+                          payload: Optional[dict] = None):
+        """
+        Отметка неудачной попытки: повтор через retry_in_seconds
+        или окончательная ошибка (status = 'failed'), если retry_in_seconds is None.
+        payload сохраняет прогресс доставки (например, кому уже отправлено).
+        """
+        with self._pool.writer() as conn:
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = CASE WHEN ? IS NULL THEN 'failed' ELSE 'pending' END,
+                    next_attempt_at = datetime('now', ?),
+                    locked_at = NULL,
+                    last_error = ?,
+                    payload = COALESCE(?, payload)
+                WHERE id = ?
+            ''', (
+                retry_in_seconds,
+                f'+{int(retry_in_seconds or 0)} seconds',
+                error,
+                json.dumps(payload) if payload is not None else None,
+                job_id
+            ))
+    
+    def list_notifications(self, kind: Optional[str] = None, limit: int = 20) -> List[OutboxEntry]:
+        """
+        Недоставленные задачи очереди: сначала ожидающие повтора и в обработке,
+        затем окончательно неудачные; внутри каждой группы новые сначала.
+        """
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(OutboxEntry)
+            cursor.execute('''
+                SELECT id, kind, question_id, status, attempts, next_attempt_at, last_error, created_at
+                FROM notification_outbox
+                WHERE (? IS NULL OR kind = ?)
+                ORDER BY status = 'failed', id DESC
+                LIMIT ?
+            ''', (kind, kind, limit))
+            return cursor.fetchall()
+    
+    def purge_failed_notifications(self, older_than_days: int) -> int:
+        """Удаление окончательно неудачных задач старше older_than_days дней"""
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM notification_outbox
+                WHERE status = 'failed' AND created_at < datetime('now', ?)
+            ''', (f'-{int(older_than_days)} days',))
+            return cursor.rowcount
@@ -0,0 +1,26 @@
+import sqlite3
+from database.manager import DatabaseManager
+
+class InMemoryDatabaseManager(DatabaseManager):
+    """
+    Хранилище в памяти для тестов и нагрузочных прогонов.
+    Использует ту же схему и запросы, что и SQLite-файл, но без дискового ввода-вывода;
+    данные (включая архив) живут только до закрытия хранилища.
+    """
+    
+    def __init__(self):
+        # Архив - именованная общая in-memory БД: она переживает DETACH после
+        # каждой архивации, пока открыто удерживающее соединение
+        archive_uri = f'file:archive_{id(self)}?mode=memory&cache=shared'
+        self._archive_holder = sqlite3.connect(archive_uri, uri=True, check_same_thread=False)
+        super().__init__(db_path=':memory:', archive_path=archive_uri)
+    
+    @property
+    def backup_name(self) -> str:
+        """Базовое имя файлов резервных копий хранилища в памяти"""
+        return 'memory'
+    
+    def close(self):
+        """Закрытие соединений; архив в памяти удаляется вместе с последним из них"""
+        super().close()
+        self._archive_holder.close()
@@ -0,0 +1,227 @@
+import sqlite3
+from database.sketch import bucket_for
+
+def fts_index_steps(table: str, column: str) -> list:
+    """
+    Шаги создания полнотекстового индекса FTS5 над колонкой таблицы.
+    Индекс хранит только токены (external content) и синхронизируется триггерами.
+    """
+    fts = f'{table}_fts'
+    return [
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, new.{column});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, new.{column});
+        END''',
+        # Индексируем уже существующие записи
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+def counter_increment(metric: str, dimension: str, key: str, delta: int = 1) -> str:
+    """SQL инкремента счетчика статистики (используется в триггерах)"""
+    return f'''
+        INSERT INTO stats_counters (metric, dimension, key, value)
+        VALUES ('{metric}', '{dimension}', {key}, {delta})
+        ON CONFLICT (metric, dimension, key) DO UPDATE SET value = value + ({delta});
+    '''
+
+def backfill_answer_sla(conn: sqlite3.Connection):
+    """Заполнение гистограмм времени ответа по уже существующим ответам"""
+    buckets = {}
+    cursor = conn.execute('''
+        SELECT date(a.created_at), COALESCE(a.moderator_id, 0),
+               (julianday(a.created_at) - julianday(q.created_at)) * 86400
+        FROM answers a
+        JOIN questions q ON q.id = a.question_id
+    ''')
+    for day, moderator_id, seconds in cursor:
+        key = ('answer', day, moderator_id, bucket_for(seconds or 0))
+        buckets[key] = buckets.get(key, 0) + 1
+    
+    conn.executemany('''
+        INSERT INTO sla_buckets (metric, day, moderator_id, bucket, count)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [key + (count,) for key, count in buckets.items()])
+
+# Упорядоченный список миграций схемы: (версия, описание, шаги).
+# Шаг — SQL-строка или функция, принимающая соединение.
+# Уже примененные миграции никогда не изменяются — новые изменения схемы
+# добавляются только новой записью в конец списка.
+MIGRATIONS = [
+    (1, 'Индексы для горячих запросов', [
+        'CREATE INDEX IF NOT EXISTS idx_questions_status_created ON questions (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_moderator ON questions (moderator_id)',
+        'CREATE INDEX IF NOT EXISTS idx_answers_question ON answers (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_question_photos_question ON question_photos (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_feedbacks_user_created ON feedbacks (user_id, created_at)',
+    ]),
+    (2, 'Срок захвата вопроса модератором', [
+        'ALTER TABLE questions ADD COLUMN claimed_at TIMESTAMP DEFAULT NULL',
+        # Уже взятые вопросы получают срок захвата с момента миграции
+        "UPDATE questions SET claimed_at = CURRENT_TIMESTAMP WHERE status = 'in_progress'",
+        'CREATE INDEX IF NOT EXISTS idx_questions_claimed ON questions (status, claimed_at)',
+    ]),
+    (3, 'Индексы для постраничной выборки по дате', [
+        'CREATE INDEX IF NOT EXISTS idx_questions_created ON questions (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_feedbacks_created ON feedbacks (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_feedbacks_status_created ON feedbacks (status, created_at)',
+    ]),
+    (4, 'Полнотекстовый поиск по вопросам, отзывам и ответам',
+        fts_index_steps('questions', 'text')
+        + fts_index_steps('feedbacks', 'text')
+        + fts_index_steps('answers', 'answer_text')
+    ),
+    # Счетчики за все время: удаление строк (архивация) их не уменьшает
+    (5, 'Инкрементальные счетчики статистики', [
+        '''CREATE TABLE IF NOT EXISTS stats_counters (
+            metric TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, dimension, key)
+        ) WITHOUT ROWID''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_questions_ai AFTER INSERT ON questions BEGIN
+            {counter_increment('questions', 'total', "''")}
+            {counter_increment('questions', 'status', 'new.status')}
+            {counter_increment('questions', 'day', 'date(new.created_at)')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_questions_au AFTER UPDATE OF status ON questions
+        WHEN old.status IS NOT new.status BEGIN
+            {counter_increment('questions', 'status', 'old.status', -1)}
+            {counter_increment('questions', 'status', 'new.status')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_feedbacks_ai AFTER INSERT ON feedbacks BEGIN
+            {counter_increment('feedbacks', 'total', "''")}
+            {counter_increment('feedbacks', 'day', 'date(new.created_at)')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS stats_answers_ai AFTER INSERT ON answers BEGIN
+            {counter_increment('answers', 'total', "''")}
+            {counter_increment('answers', 'day', 'date(new.created_at)')}
+            {counter_increment('answers', 'moderator', "COALESCE(CAST(new.moderator_id AS TEXT), '')")}
+        END''',
+        # Начальные значения по уже существующим данным
+        '''INSERT INTO stats_counters (metric, dimension, key, value)
+            SELECT 'questions', 'total', '', COUNT(*) FROM questions
+            UNION ALL
+            SELECT 'questions', 'status', status, COUNT(*) FROM questions GROUP BY status
+            UNION ALL
+            SELECT 'questions', 'day', date(created_at), COUNT(*) FROM questions GROUP BY date(created_at)
+            UNION ALL
+            SELECT 'feedbacks', 'total', '', COUNT(*) FROM feedbacks
+            UNION ALL
+            SELECT 'feedbacks', 'day', date(created_at), COUNT(*) FROM feedbacks GROUP BY date(created_at)
+            UNION ALL
+            SELECT 'answers', 'total', '', COUNT(*) FROM answers
+            UNION ALL
+            SELECT 'answers', 'day', date(created_at), COUNT(*) FROM answers GROUP BY date(created_at)
+            UNION ALL
+            SELECT 'answers', 'moderator', COALESCE(CAST(moderator_id AS TEXT), ''), COUNT(*)
+            FROM answers GROUP BY moderator_id''',
+    ]),
+    # Гистограммы времени до захвата и до ответа (см. database/sketch.py)
+    (6, 'SLA: время до захвата и до ответа', [
+        'ALTER TABLE questions ADD COLUMN first_claimed_at TIMESTAMP DEFAULT NULL',
+        'ALTER TABLE questions ADD COLUMN claim_count INTEGER NOT NULL DEFAULT 0',
+        "UPDATE questions SET first_claimed_at = claimed_at, claim_count = 1 WHERE status = 'in_progress'",
+        '''CREATE TABLE IF NOT EXISTS sla_buckets (
+            metric TEXT NOT NULL,
+            day TEXT NOT NULL,
+            moderator_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, day, moderator_id, bucket)
+        ) WITHOUT ROWID''',
+        backfill_answer_sla,
+    ]),
+    # Очередь уведомлений: задача пишется в одной транзакции с вопросом
+    (7, 'Очередь исходящих уведомлений', [
+        '''CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            question_id INTEGER,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            locked_at TIMESTAMP DEFAULT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON notification_outbox(status, next_attempt_at)',
+    ]),
+    # Сообщения "НОВЫЙ ВОПРОС" у модераторов, которые редактируются при смене статуса
+    (8, 'Сообщения модераторов о вопросах', [
+        '''CREATE TABLE IF NOT EXISTS moderator_messages (
+            question_id INTEGER NOT NULL,
+            moderator_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            is_caption INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (question_id, moderator_id)
+        ) WITHOUT ROWID''',
+    ]),
+    # Назначение вопроса одному модератору с эскалацией (Config.ROUTING_MODE)
+    (9, 'Маршрутизация вопросов по модераторам', [
+        'ALTER TABLE questions ADD COLUMN assigned_to INTEGER DEFAULT NULL',
+        'ALTER TABLE questions ADD COLUMN assigned_at TIMESTAMP DEFAULT NULL',
+        'ALTER TABLE questions ADD COLUMN escalations INTEGER NOT NULL DEFAULT 0',
+        'CREATE INDEX IF NOT EXISTS idx_questions_assigned ON questions (status, assigned_at)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_user ON questions (user_id)',
+    ]),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы базы данных"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    result = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return result[0] or 0
+
+def apply_migrations(conn: sqlite3.Connection, migrations: list = MIGRATIONS) -> int:
+    """
+    Применяет все миграции новее текущей версии схемы.
+    Каждая миграция выполняется в отдельной транзакции.
+    Возвращает итоговую версию схемы.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    
+    current_version = get_schema_version(conn)
+    
+    for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current_version:
+            continue
+        
+        try:
+            conn.execute('BEGIN')
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        current_version = version
+        print(f"✅ Применена миграция БД #{version}: {description}")
+    
+    return current_version
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import NamedTuple, Optional, List
 
 class UserState(Enum):
     START = 0
@@ -11,4 +12,92 @@ class RequestStatus(Enum):
     NEW = 'new'
     IN_PROGRESS = 'in_progress'
     ANSWERED = 'answered'
-    CLOSED = 'closed'
\ No newline at end of file
+    CLOSED = 'closed'
+
+# Записи строк БД. NamedTuple хранит поля без __dict__ на экземпляр,
+# а доступ по имени не ломается при добавлении колонок в таблицы.
+
+class User(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    created_at: str
+
+class Moderator(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+
+class Feedback(NamedTuple):
+    id: int
+    user_id: int
+    text: str
+    status: str
+    created_at: str
+
+class Question(NamedTuple):
+    id: int
+    user_id: int
+    text: str
+    status: str
+    moderator_id: Optional[int]
+    created_at: str
+    claimed_at: Optional[str]
+    username: Optional[str]
+    first_name: Optional[str]
+    moderator_username: Optional[str]
+
+class QuestionPhoto(NamedTuple):
+    file_id: str
+    file_unique_id: str
+
+class Answer(NamedTuple):
+    id: int
+    text: str
+    created_at: str
+    moderator_name: str
+
+class SearchResult(NamedTuple):
+    kind: str  # 'question', 'answer' или 'feedback'
+    id: int
+    question_id: Optional[int]
+    snippet: str
+    created_at: str
+    rank: float
+
+class QuestionDetail(NamedTuple):
+    """Вопрос вместе с фотографиями и ответами"""
+    question: Question
+    photos: List[QuestionPhoto]
+    answers: List[Answer]
+
+class OutboxJob(NamedTuple):
+    """Задача из очереди исходящих уведомлений"""
+    id: int
+    kind: str
+    question_id: Optional[int]
+    payload: dict
+    attempts: int
+
+class OutboxEntry(NamedTuple):
+    """Состояние задачи очереди уведомлений (для просмотра модераторами)"""
+    id: int
+    kind: str
+    question_id: Optional[int]
+    status: str
+    attempts: int
+    next_attempt_at: str
+    last_error: Optional[str]
+    created_at: str
+
+class ModeratorMessage(NamedTuple):
+    """Уведомление о вопросе в чате модератора"""
+    moderator_id: int
+    message_id: int
+    is_caption: bool  # подпись к фото (editMessageCaption), а не текст
+
+def record_factory(record_type):
+    """row_factory для sqlite3, собирающая строки в указанный тип записи"""
+    def factory(cursor, row):
+        return record_type._make(row)
+    return factory
@@ -0,0 +1,113 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+class ConnectionPool:
+    """
+    Пул постоянных соединений SQLite: одно соединение на запись и N на чтение.
+    Все соединения работают в режиме WAL, поэтому читатели не блокируются писателем.
+    """
+    
+    def __init__(self, db_path: str, read_pool_size: int = Config.DB_READ_POOL_SIZE,
+                 busy_timeout_ms: int = Config.DB_BUSY_TIMEOUT_MS,
+                 statement_cache_size: int = Config.DB_STATEMENT_CACHE_SIZE):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.statement_cache_size = statement_cache_size
+        
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        
+        # In-memory база существует только внутри одного соединения,
+        # поэтому читатели используют соединение писателя
+        self._shared = db_path == ':memory:'
+        self._readers = queue.Queue()
+        if not self._shared:
+            for _ in range(max(1, read_pool_size)):
+                self._readers.put(self._connect())
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Создание соединения с настройками WAL и кэшем подготовленных запросов"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        # Для новых файлов БД включаем инкрементальную очистку свободных страниц
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+    
+    @contextmanager
+    def writer(self):
+        """Соединение на запись: коммит при успехе, откат при ошибке"""
+        with self._write_lock:
+            with self._writer:
+                yield self._writer
+    
+    @contextmanager
+    def exclusive(self):
+        """
+        Соединение писателя без автоматической транзакции.
+        Нужно для команд, которые нельзя выполнять внутри транзакции (ATTACH, VACUUM).
+        """
+        with self._write_lock:
+            yield self._writer
+    
+    @contextmanager
+    def reader(self):
+        """Соединение на чтение из пула"""
+        if self._shared:
+            with self._write_lock:
+                yield self._writer
+            return
+        
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    @contextmanager
+    def snapshot(self):
+        """Соединение на чтение с единым снимком данных для нескольких запросов"""
+        with self.reader() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+    
+    def backup(self, target_path: str, pages_per_step: int, step_sleep_ms: int):
+        """
+        Онлайн-бэкап через соединение писателя порциями по pages_per_step страниц.
+        Между шагами блокировка писателя освобождается, поэтому запись не простаивает;
+        изменения, сделанные через это же соединение, SQLite переносит в копию сам.
+        """
+        target = sqlite3.connect(target_path)
+        
+        def progress(status, remaining, total):
+            self._write_lock.release()
+            try:
+                time.sleep(step_sleep_ms / 1000)
+            finally:
+                self._write_lock.acquire()
+        
+        try:
+            with self._write_lock:
+                self._writer.backup(target, pages=pages_per_step, progress=progress)
+        finally:
+            target.close()
+    
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
@@ -0,0 +1,40 @@
+from typing import Optional
+from config import Config
+from database.async_manager import AsyncDatabaseManager
+from database.storage import create_storage
+
+_database: Optional[AsyncDatabaseManager] = None
+
+def init_database(backend: str = Config.STORAGE_BACKEND) -> AsyncDatabaseManager:
+    """
+    Создание общего хранилища приложения (один раз — из main.py или bot.py).
+    Повторный вызов возвращает уже созданное хранилище.
+    """
+    global _database
+    if _database is None:
+        _database = AsyncDatabaseManager(manager=create_storage(backend))
+    return _database
+
+def get_database() -> AsyncDatabaseManager:
+    """Общее хранилище приложения"""
+    if _database is None:
+        raise RuntimeError("Хранилище не инициализировано: вызовите init_database() при запуске")
+    return _database
+
+async def close_database():
+    """Сброс очередей и закрытие общего хранилища"""
+    global _database
+    if _database is not None:
+        await _database.close()
+        _database = None
+
+class DatabaseProxy:
+    """
+    Ссылка на общее хранилище для модулей обработчиков.
+    Обращение к атрибутам перенаправляется в хранилище, созданное init_database().
+    """
+    
+    def __getattr__(self, name):
+        return getattr(get_database(), name)
+
+db = DatabaseProxy()
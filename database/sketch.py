@@ -0,0 +1,45 @@
+import math
+
+# Логарифмическая гистограмма (по принципу DDSketch): значение попадает в корзину
+# с номером ceil(log_gamma(value)), а квантиль восстанавливается с относительной
+# погрешностью не больше RELATIVE_ACCURACY. Гистограммы складываются простым
+# суммированием счетчиков корзин, поэтому их можно хранить по дням и модераторам
+# и объединять за любое окно без пересчета исходных данных.
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+def bucket_for(value: float) -> int:
+    """Номер корзины для значения (значения до 1 попадают в корзину 0)"""
+    if value <= 1:
+        return 0
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+def bucket_value(bucket: int) -> float:
+    """Представительное значение корзины"""
+    if bucket <= 0:
+        return 0.0
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+def quantile(buckets: dict, q: float) -> float:
+    """Квантиль q (0..1) по словарю {номер корзины: количество}"""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    
+    rank = q * (total - 1)
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen > rank:
+            return bucket_value(bucket)
+    return bucket_value(max(buckets))
+
+def summarize(buckets: dict, quantiles=(0.5, 0.9, 0.99)) -> dict:
+    """Количество наблюдений и перцентили (p50, p90, p99) в секундах"""
+    summary = {'count': sum(buckets.values())}
+    for q in quantiles:
+        value = quantile(buckets, q)
+        summary[f'p{int(q * 100)}'] = round(value) if value is not None else None
+    return summary
@@ -0,0 +1,252 @@
+import importlib
+from abc import ABC, abstractmethod
+from typing import List, Optional, Dict, Any, Tuple
+from config import Config
+from database.models import (
+    User, Moderator, Feedback, Question, QuestionPhoto, Answer, QuestionDetail, SearchResult, OutboxJob, OutboxEntry,
+    ModeratorMessage
+)
+
+class Storage(ABC):
+    """
+    Интерфейс хранилища бота.
+    Реализации: DatabaseManager (SQLite-файл) и InMemoryDatabaseManager (без диска).
+    Новый движок (например, серверная БД) реализует этот интерфейс
+    и регистрируется в STORAGE_BACKENDS.
+    """
+    
+    @abstractmethod
+    def close(self):
+        """Закрытие соединений с хранилищем"""
+    
+    # Пользователи и модераторы
+    
+    @abstractmethod
+    def add_user(self, user_id: int, username: str, first_name: str):
+        """Добавление/обновление пользователя"""
+    
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Получение пользователя по ID"""
+    
+    @abstractmethod
+    def add_moderator(self, user_id: int, username: str, first_name: str):
+        """Добавление модератора"""
+    
+    @abstractmethod
+    def get_active_moderators(self) -> List[Moderator]:
+        """Получение списка активных модераторов"""
+    
+    # Отзывы
+    
+    @abstractmethod
+    def add_feedback(self, user_id: int, text: str) -> int:
+        """Добавление отзыва"""
+    
+    @abstractmethod
+    def apply_write_batch(self, users: List[tuple], feedbacks: List[tuple]):
+        """Пакетная запись пользователей и отзывов одной транзакцией"""
+    
+    @abstractmethod
+    def list_feedbacks(self, status: Optional[str] = None, date_from: Optional[str] = None,
+                       date_to: Optional[str] = None, after: Optional[Tuple[str, int]] = None,
+                       limit: int = 50) -> List[Feedback]:
+        """Постраничная выборка отзывов"""
+    
+    # Вопросы и ответы
+    
+    @abstractmethod
+    def add_question(self, user_id: int, text: str) -> int:
+        """Добавление вопроса"""
+    
+    @abstractmethod
+    def create_question(self, user_id: int, text: str, photos: List[Tuple[str, str]] = (),
+                        payload: Optional[dict] = None, prepare_payload=None) -> int:
+        """Добавление вопроса с фотографиями и задачей уведомления в одной транзакции"""
+    
+    @abstractmethod
+    def add_question_photo(self, question_id: int, file_id: str, file_unique_id: str):
+        """Добавление фотографии к вопросу"""
+    
+    @abstractmethod
+    def get_question(self, question_id: int) -> Optional[Question]:
+        """Получение вопроса по ID"""
+    
+    @abstractmethod
+    def get_question_photos(self, question_id: int) -> List[QuestionPhoto]:
+        """Получение фотографий вопроса"""
+    
+    @abstractmethod
+    def get_question_detail(self, question_id: int) -> Optional[QuestionDetail]:
+        """Вопрос с фотографиями и ответами"""
+    
+    @abstractmethod
+    def get_question_status(self, question_id: int) -> Optional[str]:
+        """Получение статуса вопроса"""
+    
+    @abstractmethod
+    def is_question_answered(self, question_id: int) -> bool:
+        """Проверка, отвечен ли вопрос"""
+    
+    @abstractmethod
+    def update_question_status(self, question_id: int, status: str):
+        """Обновление статуса вопроса"""
+    
+    @abstractmethod
+    def set_question_in_progress(self, question_id: int, moderator_id: int) -> bool:
+        """Захват вопроса модератором"""
+    
+    @abstractmethod
+    def release_question_lock(self, question_id: int) -> bool:
+        """Освобождение захвата вопроса"""
+    
+    @abstractmethod
+    def get_expired_claims(self, lease_seconds: int) -> List[int]:
+        """ID вопросов с истекшим сроком захвата"""
+    
+    @abstractmethod
+    def get_question_moderator(self, question_id: int) -> Optional[int]:
+        """ID модератора, взявшего вопрос в работу"""
+    
+    @abstractmethod
+    def assign_question(self, question_id: int, moderator_id: int):
+        """Назначение нового вопроса модератору"""
+    
+    @abstractmethod
+    def get_last_assigned_moderator(self) -> Optional[int]:
+        """Модератор, которому был назначен последний вопрос"""
+    
+    @abstractmethod
+    def get_user_last_moderator(self, user_id: int, before_question_id: int) -> Optional[int]:
+        """Модератор, который вел предыдущий вопрос пользователя"""
+    
+    @abstractmethod
+    def get_moderator_loads(self) -> Dict[int, int]:
+        """Число взятых и назначенных вопросов на каждом модераторе"""
+    
+    @abstractmethod
+    def get_unclaimed_assignments(self, timeout_seconds: int) -> List[Tuple[int, int, int]]:
+        """Назначенные, но не взятые вовремя вопросы"""
+    
+    @abstractmethod
+    def escalate_question(self, question_id: int, moderator_ids: List[int], reassign_to: Optional[int]) -> bool:
+        """Переназначение невзятого вопроса с постановкой уведомления в очередь"""
+    
+    @abstractmethod
+    def get_new_questions(self) -> List[Question]:
+        """Список новых вопросов"""
+    
+    @abstractmethod
+    def get_in_progress_questions(self) -> List[Question]:
+        """Список вопросов в работе"""
+    
+    @abstractmethod
+    def list_questions(self, status: Optional[str] = None, date_from: Optional[str] = None,
+                       date_to: Optional[str] = None, after: Optional[Tuple[str, int]] = None,
+                       limit: int = 50) -> List[Question]:
+        """Постраничная выборка вопросов"""
+    
+    @abstractmethod
+    def add_answer(self, question_id: int, moderator_id: int, answer_text: str) -> int:
+        """Добавление ответа на вопрос"""
+    
+    @abstractmethod
+    def queue_answer_delivery(self, question_id: int, moderator_id: int, answer_text: str,
+                              user_id: int, message_text: str, error: str) -> int:
+        """Сохранение недоставленного ответа и постановка отправки в очередь повторов"""
+    
+    @abstractmethod
+    def save_moderator_messages(self, question_id: int, messages: List[Tuple[int, int, bool]]):
+        """Сохранение message_id уведомлений о вопросе у модераторов"""
+    
+    @abstractmethod
+    def get_moderator_messages(self, question_id: int) -> List[ModeratorMessage]:
+        """Уведомления о вопросе, отправленные модераторам"""
+    
+    @abstractmethod
+    def get_question_answers(self, question_id: int) -> List[Answer]:
+        """Получение ответов на вопрос"""
+    
+    # Поиск и статистика
+    
+    @abstractmethod
+    def search(self, terms: str, kinds: Optional[List[str]] = None, limit: int = 20) -> List[SearchResult]:
+        """Полнотекстовый поиск"""
+    
+    @abstractmethod
+    def get_stats(self, days: int = 7) -> Dict[str, Any]:
+        """Счетчики статистики"""
+    
+    @abstractmethod
+    def get_sla_stats(self, days: int = 7) -> Dict[str, Any]:
+        """Перцентили времени до захвата и до ответа"""
+    
+    # Обслуживание
+    
+    @abstractmethod
+    def archive_old_questions(self, older_than_days: int, batch_size: int) -> List[int]:
+        """Перенос старых закрытых вопросов в архив"""
+    
+    @abstractmethod
+    def archive_old_feedbacks(self, older_than_days: int, batch_size: int) -> int:
+        """Перенос старых отзывов в архив"""
+    
+    @abstractmethod
+    def run_maintenance(self, vacuum_pages: int):
+        """Обслуживание хранилища (очистка, статистика планировщика)"""
+    
+    @abstractmethod
+    def enable_incremental_vacuum(self) -> bool:
+        """Однократное включение инкрементальной очистки (полная перестройка хранилища)"""
+    
+    @abstractmethod
+    def backup(self, target_path: str, pages_per_step: int = Config.BACKUP_PAGES_PER_STEP,
+               step_sleep_ms: int = Config.BACKUP_STEP_SLEEP_MS):
+        """Резервная копия хранилища в файл"""
+    
+    @property
+    @abstractmethod
+    def backup_name(self) -> str:
+        """Базовое имя файлов резервных копий хранилища"""
+    
+    # Очередь исходящих уведомлений
+    
+    @abstractmethod
+    def enqueue_notification(self, kind: str, question_id: Optional[int], payload: Optional[dict] = None) -> int:
+        """Постановка уведомления в очередь"""
+    
+    @abstractmethod
+    def claim_notifications(self, limit: int, lease_seconds: int) -> List[OutboxJob]:
+        """Захват готовых к отправке задач"""
+    
+    @abstractmethod
+    def complete_notification(self, job_id: int):
+        """Удаление доставленной задачи"""
+    
+    @abstractmethod
+    def fail_notification(self, job_id: int, error: str, retry_in_seconds: Optional[float],
+                          payload: Optional[dict] = None):
+        """Отметка неудачной попытки доставки"""
+    
+    @abstractmethod
+    def list_notifications(self, kind: Optional[str] = None, limit: int = 20) -> List[OutboxEntry]:
+        """Недоставленные задачи очереди"""
+    
+    @abstractmethod
+    def purge_failed_notifications(self, older_than_days: int) -> int:
+        """Удаление старых окончательно неудачных задач"""
+
+# Доступные движки хранилища: имя -> "модуль.Класс"
+STORAGE_BACKENDS = {
+    'sqlite': 'database.manager.DatabaseManager',
+    'memory': 'database.memory.InMemoryDatabaseManager',
+}
+
+def create_storage(backend: str = Config.STORAGE_BACKEND) -> Storage:
+    """Создание хранилища по имени движка из STORAGE_BACKENDS"""
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Неизвестный движок хранилища: {backend}")
+    
+    module_name, class_name = STORAGE_BACKENDS[backend].rsplit('.', 1)
+    storage_class = getattr(importlib.import_module(module_name), class_name)
+    return storage_class()
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timezone
+from config import Config
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи для некритичных данных (пользователи и отзывы).
+    Записи накапливаются в памяти и сбрасываются в БД одной транзакцией
+    каждые flush_interval_ms миллисекунд или при накоплении max_batch записей.
+    """
+    
+    def __init__(self, db, flush_interval_ms: int = Config.WRITE_BEHIND_FLUSH_MS,
+                 max_batch: int = Config.WRITE_BEHIND_MAX_BATCH):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        
+        # Пользователи по user_id — в пакет попадает только последняя версия профиля
+        self._users = {}
+        self._feedbacks = []
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+    
+    def __len__(self):
+        return len(self._users) + len(self._feedbacks)
+    
+    def add_user(self, user_id: int, username: str, first_name: str):
+        """Постановка пользователя в очередь записи"""
+        self._users[user_id] = (user_id, username, first_name)
+        self._check_batch_size()
+    
+    def add_feedback(self, user_id: int, text: str):
+        """Постановка отзыва в очередь записи (с исходным временем создания)"""
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._feedbacks.append((user_id, text, created_at))
+        self._check_batch_size()
+    
+    def _check_batch_size(self):
+        if len(self) >= self.max_batch:
+            self._batch_ready.set()
+    
+    async def flush(self):
+        """Сброс накопленных записей в БД одной транзакцией"""
+        async with self._flush_lock:
+            if not len(self):
+                return
+            
+            users = list(self._users.values())
+            feedbacks = self._feedbacks
+            self._users = {}
+            self._feedbacks = []
+            
+            try:
+                await self.db.run(self.db.sync.apply_write_batch, users, feedbacks)
+            except Exception as e:
+                # Возвращаем записи в очередь, чтобы не потерять их до следующего сброса
+                print(f"❌ Ошибка пакетной записи в БД: {e}")
+                for user in users:
+                    self._users.setdefault(user[0], user)
+                self._feedbacks = feedbacks + self._feedbacks
+    
+    async def run(self):
+        """Фоновая задача периодического сброса очереди"""
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
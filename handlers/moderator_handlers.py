@@ -1,10 +1,18 @@
+import asyncio
+import os
 from telegram import Update, ReplyKeyboardRemove, InputMediaPhoto
 from telegram.ext import ContextTypes, MessageHandler, filters, ConversationHandler, CommandHandler
-from database.manager import DatabaseManager
+from database.provider import db
 from config import Config
-from utils.helpers import notify_moderators_about_taken_question
-
-db = DatabaseManager()
+from utils.maintenance import run_backup_once
+from utils.outbox import wake_outbox_workers
+from utils.helpers import (
+    notification_editor,
+    moderator_registry,
+    is_moderator,
+    is_admin,
+    format_statistics
+)
 
 # Состояния для ConversationHandler
 AWAITING_ANSWER = 1
@@ -18,12 +26,50 @@ async def add_moderator(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
         return
     
-    db.add_moderator(user.id, user.username, user.first_name)
+    await db.add_moderator(user.id, user.username, user.first_name)
+    moderator_registry.invalidate()
     
     await update.message.reply_text(
         "✅ Вы добавлены как модератор! Теперь вы будете получать уведомления о новых вопросах."
     )
 
+async def backup_database(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда для создания резервной копии БД (только для администраторов)"""
+    user = update.effective_user
+    
+    if user.id not in Config.ADMIN_IDS:
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    await update.message.reply_text("💾 Создаю резервную копию базы данных...")
+    
+    try:
+        backup_path = await run_backup_once(db)
+        size_mb = os.path.getsize(backup_path) / (1024 * 1024)
+        await update.message.reply_text(f"✅ Резервная копия создана: {backup_path} ({size_mb:.1f} МБ)")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка резервного копирования: {e}")
+
+async def vacuum_database(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Однократный перевод БД в режим incremental auto_vacuum (только для администраторов)"""
+    user = update.effective_user
+    
+    if user.id not in Config.ADMIN_IDS:
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    await update.message.reply_text(
+        "🧹 Перестраиваю файл базы данных (VACUUM). Запись в БД на это время приостановлена..."
+    )
+    
+    try:
+        if await db.enable_incremental_vacuum():
+            await update.message.reply_text("✅ Режим incremental auto_vacuum включен.")
+        else:
+            await update.message.reply_text("ℹ️ Режим incremental auto_vacuum уже включен.")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка VACUUM: {e}")
+
 async def start_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало ответа на вопрос"""
     message_text = update.message.text
@@ -33,9 +79,9 @@ async def start_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         question_id = int(message_text.split('_')[1])
         
         # Проверяем, может ли текущий модератор взять вопрос в работу
-        if not db.set_question_in_progress(question_id, moderator_id):
+        if not await db.set_question_in_progress(question_id, moderator_id):
             # Вопрос уже взят другим модератором
-            current_moderator_id = db.get_question_moderator(question_id)
+            current_moderator_id = await db.get_question_moderator(question_id)
             if current_moderator_id:
                 await update.message.reply_text(
                     f"⚠️ Вопрос #Q{question_id} уже взят в работу другим модератором."
@@ -47,24 +93,23 @@ async def start_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             return ConversationHandler.END
                 
         # Получаем информацию о вопросе
-        question = db.get_question(question_id)
+        question = await db.get_question(question_id)
         if not question:
             await update.message.reply_text("❌ Вопрос не найден.")
-            db.release_question_lock(question_id)  # Освобождаем блокировку
+            await db.release_question_lock(question_id)  # Освобождаем блокировку
             return ConversationHandler.END
         
-        # Уведомляем других модераторов о том, что вопрос взят в работу
-        moderator_name = update.effective_user.first_name
-        await notify_moderators_about_taken_question(question_id, moderator_name, context)
+        # Отмечаем захват в уведомлениях о вопросе у всех модераторов
+        notification_editor.schedule(question_id)
         
         # Получаем фотографии вопроса если есть
-        photos = db.get_question_photos(question_id)
+        photos = await db.get_question_photos(question_id)
         
         response_text = (
             f"✏️ Вы отвечаете на вопрос #Q{question_id}\n"
-            f"От: {question[5]} (@{question[4] if question[4] else 'без username'})\n"
-            f"ID пользователя: {question[1]}\n\n"
-            f"❓ Вопрос:\n{question[2]}\n\n"
+            f"От: {question.first_name} (@{question.username if question.username else 'без username'})\n"
+            f"ID пользователя: {question.user_id}\n\n"
+            f"❓ Вопрос:\n{question.text}\n\n"
         )
         
         if photos:
@@ -72,7 +117,7 @@ async def start_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 # Отправляем одно фото с подписью
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id,
-                    photo=photos[0][0],  # file_id
+                    photo=photos[0].file_id,
                     caption=response_text + "📷 К вопросу прикреплено 1 фото\n\n📝 Пожалуйста, напишите ваш ответ (или /cancel для отмены):"
                 )
             else:
@@ -82,14 +127,14 @@ async def start_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 # Первое фото с подписью
                 media_group.append(
                     InputMediaPhoto(
-                        media=photos[0][0],
+                        media=photos[0].file_id,
                         caption=response_text + f"📷 К вопросу прикреплено {len(photos)} фото\n\n📝 Пожалуйста, напишите ваш ответ (или /cancel для отмены):"
                     )
                 )
                 
                 # Остальные фото без подписи
                 for photo in photos[1:]:
-                    media_group.append(InputMediaPhoto(media=photo[0]))
+                    media_group.append(InputMediaPhoto(media=photo.file_id))
                 
                 await context.bot.send_media_group(
                     chat_id=update.effective_chat.id,
@@ -120,7 +165,16 @@ async def receive_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
     
     # Проверяем, что текущий модератор все еще владеет вопросом
-    current_moderator_id = db.get_question_moderator(question_id)
+    current_moderator_id = await db.get_question_moderator(question_id)
+    if current_moderator_id is None:
+        # Захват истек и был снят, но другой модератор вопрос еще не взял
+        await update.message.reply_text(
+            f"⏰ Срок захвата вопроса #Q{question_id} истек. Ответ не отправлен.\n"
+            f"Возьмите вопрос снова: /answer_{question_id}",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        context.user_data.pop('answering_question_id', None)
+        return ConversationHandler.END
     if current_moderator_id != moderator_id:
         await update.message.reply_text(
             f"⚠️ Вопрос #Q{question_id} уже взят другим модератором. Ответ не будет отправлен."
@@ -129,13 +183,34 @@ async def receive_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
         
     # Получаем информацию о вопросе
-    question = db.get_question(question_id)
+    question = await db.get_question(question_id)
     if not question:
         await update.message.reply_text("❌ Вопрос не найден в базе данных.")
         context.user_data.pop('answering_question_id', None)
         return ConversationHandler.END
     
-    user_id = question[1]  # ID пользователя, задавшего вопрос
+    user_id = question.user_id  # ID пользователя, задавшего вопрос
+    
+    if user_id == 0:
+        # Вопрос с сайта: в Telegram отправлять некому, сайт получает ответ
+        # через GET /questions/{id}, поэтому ответ только сохраняется
+        try:
+            answer_id = await db.add_answer(question_id, moderator_id, answer_text)
+            await db.update_question_status(question_id, 'answered')
+            notification_editor.schedule(question_id)
+            await update.message.reply_text(
+                f"✅ Ответ #A{answer_id} сохранен, он будет показан на сайте.",
+                reply_markup=ReplyKeyboardRemove()
+            )
+            print(f"✅ Ответ #{answer_id} на вопрос с сайта сохранен (Вопрос #{question_id})")
+        except Exception as e:
+            print(f"❌ Ошибка сохранения в БД: {e}")
+            await update.message.reply_text(f"❌ Ошибка при сохранении ответа: {e}")
+        
+        context.user_data.pop('answering_question_id', None)
+        return ConversationHandler.END
+    
+    delivered = False
     
     try:
         # Отправляем ответ пользователю
@@ -149,10 +224,12 @@ async def receive_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             chat_id=user_id,
             text=user_response_text
         )
+        delivered = True
         
         # Сохраняем ответ в базу данных
-        answer_id = db.add_answer(question_id, moderator_id, answer_text)
-        db.update_question_status(question_id, 'answered')
+        answer_id = await db.add_answer(question_id, moderator_id, answer_text)
+        await db.update_question_status(question_id, 'answered')
+        notification_editor.schedule(question_id)
         
         # Очищаем контекст
         context.user_data.pop('answering_question_id', None)
@@ -165,6 +242,13 @@ async def receive_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         print(f"✅ Ответ #{answer_id} отправлен пользователю {user_id} (Вопрос #{question_id})")
         
     except Exception as e:
+        if delivered:
+            # Ответ уже у пользователя, повторять отправку нельзя
+            print(f"❌ Ошибка сохранения в БД: {e}")
+            await update.message.reply_text(f"⚠️ Ответ отправлен пользователю, но не сохранен в базе: {e}")
+            context.user_data.pop('answering_question_id', None)
+            return ConversationHandler.END
+        
         error_message = f"❌ Ошибка при отправке ответа: {e}"
         print(error_message)
         
@@ -174,15 +258,23 @@ async def receive_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         elif "Forbidden" in str(e):
             error_message += "\n\n⚠️ У бота нет прав для отправки сообщения этому пользователю."
         
-        await update.message.reply_text(error_message)
-        
-        # Все равно сохраняем ответ в БД, но отмечаем ошибку
+        # Сохраняем ответ и ставим доставку в очередь повторов
         try:
-            answer_id = db.add_answer(question_id, moderator_id, answer_text)
-            db.update_question_status(question_id, 'error')
-            print(f"📁 Ответ #{answer_id} сохранен в БД, но не доставлен пользователю")
+            answer_id = await db.queue_answer_delivery(
+                question_id, moderator_id, answer_text, user_id, user_response_text, str(e)
+            )
+            wake_outbox_workers()
+            notification_editor.schedule(question_id)
+            error_message += (
+                f"\n\n🔁 Ответ #A{answer_id} сохранен, отправка будет повторена автоматически. "
+                f"Статус доставки: /deliveries"
+            )
+            print(f"📁 Ответ #{answer_id} сохранен в БД и поставлен в очередь повторной доставки")
         except Exception as db_error:
             print(f"❌ Ошибка сохранения в БД: {db_error}")
+        
+        await update.message.reply_text(error_message)
+        context.user_data.pop('answering_question_id', None)
     
     return ConversationHandler.END
 
@@ -192,7 +284,8 @@ async def cancel_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     
     if question_id:
         # Освобождаем блокировку вопроса
-        db.release_question_lock(question_id)
+        if await db.release_question_lock(question_id):
+            notification_editor.schedule(question_id)
         context.user_data.pop('answering_question_id', None)
     
     await update.message.reply_text(
@@ -201,17 +294,111 @@ async def cancel_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     )
     return ConversationHandler.END
 
+async def release_expired_claims() -> list:
+    """Освобождает вопросы, срок захвата которых модератором истек"""
+    lease_seconds = Config.QUESTION_CLAIM_LEASE_MINUTES * 60
+    released = []
+    
+    for question_id in await db.get_expired_claims(lease_seconds):
+        if await db.release_question_lock(question_id):
+            released.append(question_id)
+            notification_editor.schedule(question_id)
+            print(f"⏰ Захват вопроса #Q{question_id} истек, вопрос снова доступен")
+    
+    return released
+
+async def run_claim_sweeper():
+    """Фоновая задача: периодически освобождает истекшие захваты вопросов"""
+    while True:
+        try:
+            await release_expired_claims()
+        except Exception as e:
+            print(f"❌ Ошибка освобождения истекших захватов: {e}")
+        
+        await asyncio.sleep(Config.CLAIM_SWEEP_INTERVAL_SECONDS)
+
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать статистику для модераторов"""
-    # TODO: Реализовать сбор статистики из БД
-    stats_text = (
-        "📊 Статистика обратной связи:\n"
-        "• Новых вопросов: 0\n"
-        "• Всего отзывов: 0\n"
-        "• Ответов отправлено: 0"
-    )
+    user_id = update.effective_user.id
+    
+    if not (await is_moderator(user_id) or is_admin(user_id)):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    stats = await db.get_stats()
+    sla = await db.get_sla_stats()
+    moderators = await moderator_registry.get_moderators()
+    
+    await update.message.reply_text(format_statistics(stats, sla, moderators))
+
+SEARCH_KIND_LABELS = {
+    'question': '❓ Вопрос',
+    'answer': '📧 Ответ',
+    'feedback': '🗣️ Отзыв'
+}
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Поиск по вопросам, ответам и отзывам: /search <слова>"""
+    user_id = update.effective_user.id
+    
+    if not (await is_moderator(user_id) or is_admin(user_id)):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    terms = ' '.join(context.args or [])
+    if not terms.strip():
+        await update.message.reply_text("❌ Укажите слова для поиска: /search оплата картой")
+        return
+    
+    results = await db.search(terms, limit=Config.SEARCH_RESULTS_LIMIT)
+    if not results:
+        await update.message.reply_text(f"🔍 По запросу «{terms}» ничего не найдено.")
+        return
+    
+    lines = [f"🔍 Результаты поиска «{terms}»:\n"]
+    for result in results:
+        label = SEARCH_KIND_LABELS.get(result.kind, result.kind)
+        if result.question_id:
+            header = f"{label} #Q{result.question_id} ({result.created_at})"
+        else:
+            header = f"{label} #{result.id} ({result.created_at})"
+        lines.append(f"{header}\n{result.snippet}")
+        if result.kind == 'question':
+            lines.append(f"💬 /answer_{result.question_id}")
+        lines.append("")
+    
+    await update.message.reply_text('\n'.join(lines))
+
+DELIVERY_STATUS_LABELS = {
+    'pending': '⏳ ожидает повтора',
+    'processing': '🔄 отправляется',
+    'failed': '❌ не доставлен',
+}
+
+async def list_deliveries(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Список ответов, которые пока не удалось доставить пользователям"""
+    user_id = update.effective_user.id
+    
+    if not (await is_moderator(user_id) or is_admin(user_id)):
+        await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    deliveries = await db.list_notifications('answer_delivery', Config.DELIVERIES_LIST_LIMIT)
+    if not deliveries:
+        await update.message.reply_text("✅ Все ответы доставлены пользователям.")
+        return
+    
+    lines = ["📬 Недоставленные ответы:\n"]
+    for delivery in deliveries:
+        status = DELIVERY_STATUS_LABELS.get(delivery.status, delivery.status)
+        lines.append(f"#Q{delivery.question_id}: {status}, попыток: {delivery.attempts}")
+        if delivery.status == 'pending':
+            lines.append(f"Следующая попытка: {delivery.next_attempt_at}")
+        if delivery.last_error:
+            lines.append(f"Ошибка: {delivery.last_error}")
+        lines.append("")
     
-    await update.message.reply_text(stats_text)
+    await update.message.reply_text('\n'.join(lines))
 
 # Создаем ConversationHandler для ответов модераторов
 def get_answer_conversation_handler():
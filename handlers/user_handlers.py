@@ -1,10 +1,8 @@
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, MessageHandler, filters
-from database.manager import DatabaseManager
+from database.provider import db
 from states.user_states import UserState
-from utils.helpers import notify_moderators
-
-db = DatabaseManager()
+from utils.outbox import wake_outbox_workers
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
@@ -12,7 +10,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     # Сохраняем/обновляем пользователя в базе
     user = update.effective_user
-    db.add_user(user.id, user.username, user.first_name)
+    await db.add_user(user.id, user.username, user.first_name)
     
     welcome_text = """
 Привет! 👋
@@ -107,7 +105,7 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Сохраняем отзыв в базу данных
     user_id = update.effective_user.id
-    feedback_id = db.add_feedback(user_id, feedback_text)
+    feedback_id = await db.add_feedback(user_id, feedback_text)
     
     await update.message.reply_text(
         "✅ Спасибо за ваш отзыв! 💙\n"
@@ -115,7 +113,10 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         reply_markup=ReplyKeyboardMarkup([["🗣️ Оставить отзыв", "❓ Задать вопрос"]], resize_keyboard=True)
     )
     
-    print(f"Отзыв #{feedback_id} сохранен в БД от пользователя {user_id}")
+    if feedback_id:
+        print(f"Отзыв #{feedback_id} сохранен в БД от пользователя {user_id}")
+    else:
+        print(f"Отзыв от пользователя {user_id} поставлен в очередь записи")
     context.user_data['state'] = UserState.AWAITING_CHOICE
 
 async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -216,15 +217,15 @@ async def process_question_complete(update: Update, context: ContextTypes.DEFAUL
         )
         return
     
-    # Сохраняем вопрос в базу данных
-    question_id = db.add_question(user_id, question_text)
-    
-    # Сохраняем фотографии если есть
-    for photo in photos:
-        db.add_question_photo(question_id, photo['file_id'], photo['file_unique_id'])
-    
-    # Уведомляем модераторов
-    await notify_moderators(update, context, question_id, question_text, photos)
+    # Сохраняем вопрос с фотографиями и ставим уведомление модераторам в очередь
+    user = update.effective_user
+    await db.create_question(
+        user_id,
+        question_text,
+        [(photo['file_id'], photo['file_unique_id']) for photo in photos],
+        payload={'author': {'first_name': user.first_name, 'username': user.username}}
+    )
+    wake_outbox_workers()
     
     # Формируем сообщение для пользователя
     photos_count = len(photos)
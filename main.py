@@ -7,6 +7,8 @@ from typing import Optional, List
 import uvicorn
 
 from bot import start_bot
+from database.provider import init_database, close_database
+from utils.helpers import open_http_session, close_http_session
 from api.handlers import api_router
 from config import Config
 
@@ -19,7 +21,13 @@ logging.basicConfig(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Запуск и остановка бота вместе с FastAPI"""
-    # Запускаем бота в фоне
+    # Создаем общее хранилище для API и бота
+    init_database()
+    
+    # Общая keep-alive сессия для прямых вызовов Bot API
+    await open_http_session()
+    
+    # Запускаем бота в фоне (вместе с воркерами уведомлений)
     bot_task = asyncio.create_task(start_bot())
     
     yield
@@ -30,6 +38,9 @@ async def lifespan(app: FastAPI):
         await bot_task
     except asyncio.CancelledError:
         pass
+    
+    await close_http_session()
+    await close_database()
 
 # Создание FastAPI приложения
 app = FastAPI(
@@ -0,0 +1,108 @@
+"""
+Проверка контракта Storage на обоих движках: SQLite-файл и хранилище в памяти
+должны одинаково вести себя при захвате вопросов, постраничной выборке,
+архивации и работе очереди уведомлений.
+"""
+import pytest
+from database.manager import DatabaseManager
+from database.memory import InMemoryDatabaseManager
+from database.storage import Storage
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        instance = DatabaseManager(str(tmp_path / 'bot.db'), str(tmp_path / 'archive.db'))
+    else:
+        instance = InMemoryDatabaseManager()
+    yield instance
+    instance.close()
+
+def backdate_question(storage, question_id: int, days: int):
+    """Сдвиг даты создания вопроса в прошлое (публичного API для этого нет)"""
+    with storage._pool.writer() as conn:
+        conn.execute(
+            "UPDATE questions SET created_at = datetime('now', ?) WHERE id = ?",
+            (f'-{days} days', question_id)
+        )
+
+def archived_question_ids(storage) -> list:
+    with storage._pool.exclusive() as conn:
+        storage._attach_archive(conn)
+        try:
+            return [row[0] for row in conn.execute('SELECT id FROM archive.questions ORDER BY id')]
+        finally:
+            conn.execute('DETACH DATABASE archive')
+
+def test_implements_storage(storage):
+    assert isinstance(storage, Storage)
+    assert storage.backup_name
+
+def test_claim_and_release(storage):
+    question_id = storage.create_question(10, 'Не работает вход')
+    
+    assert storage.set_question_in_progress(question_id, 1)
+    assert not storage.set_question_in_progress(question_id, 2)
+    assert storage.get_question_moderator(question_id) == 1
+    assert storage.get_question_status(question_id) == 'in_progress'
+    
+    assert storage.release_question_lock(question_id)
+    assert not storage.release_question_lock(question_id)
+    assert storage.get_question_moderator(question_id) is None
+    assert storage.get_question_status(question_id) == 'new'
+    assert storage.set_question_in_progress(question_id, 2)
+
+def test_list_questions_pagination(storage):
+    question_ids = [storage.create_question(10, f'Вопрос {index}') for index in range(5)]
+    
+    seen = []
+    after = None
+    while True:
+        page = storage.list_questions(after=after, limit=2)
+        if not page:
+            break
+        seen.extend(question.id for question in page)
+        after = (page[-1].created_at, page[-1].id)
+    
+    assert seen == sorted(question_ids, reverse=True)
+
+def test_archive_keeps_rows_between_runs(storage):
+    old_question = storage.create_question(10, 'Старый вопрос')
+    older_question = storage.create_question(10, 'Еще более старый вопрос')
+    fresh_question = storage.create_question(10, 'Свежий вопрос')
+    for question_id in (old_question, older_question, fresh_question):
+        storage.update_question_status(question_id, 'answered')
+    backdate_question(storage, old_question, 40)
+    backdate_question(storage, older_question, 50)
+    
+    # Две порции: архив должен пережить отключение между ними
+    assert storage.archive_old_questions(30, 1) == [old_question]
+    assert storage.archive_old_questions(30, 1) == [older_question]
+    assert storage.archive_old_questions(30, 1) == []
+    
+    assert storage.get_question(old_question) is None
+    assert storage.get_question(fresh_question) is not None
+    assert archived_question_ids(storage) == [old_question, older_question]
+
+def test_outbox_lifecycle(storage):
+    question_id = storage.create_question(10, 'Вопрос', payload={'author': {'first_name': 'Иван'}})
+    
+    jobs = storage.claim_notifications(10, 60)
+    assert [(job.kind, job.question_id, job.attempts) for job in jobs] == [('new_question', question_id, 1)]
+    assert jobs[0].payload == {'author': {'first_name': 'Иван'}}
+    # Захваченная задача не выдается повторно до истечения аренды
+    assert storage.claim_notifications(10, 60) == []
+    
+    storage.fail_notification(jobs[0].id, 'timeout', 0, {'delivered': [1]})
+    retried = storage.claim_notifications(10, 60)
+    assert [(job.id, job.attempts, job.payload) for job in retried] == [(jobs[0].id, 2, {'delivered': [1]})]
+    
+    storage.complete_notification(jobs[0].id)
+    assert storage.list_notifications() == []
+
+def test_failed_notifications_listed_after_pending(storage):
+    failed_id = storage.enqueue_notification('answer_delivery', None, {})
+    pending_id = storage.enqueue_notification('answer_delivery', None, {})
+    storage.fail_notification(failed_id, 'Forbidden', None)
+    
+    entries = storage.list_notifications('answer_delivery')
+    assert [(entry.id, entry.status) for entry in entries] == [(pending_id, 'pending'), (failed_id, 'failed')]
@@ -1,15 +1,95 @@
-from telegram import Update, InputMediaPhoto
 from telegram.ext import ContextTypes
-from database.manager import DatabaseManager
+from database.provider import db
+from database.models import QuestionPhoto
 from config import Config
+from utils.rate_limiter import rate_limiter, TelegramAPIError
 import base64
+import html
 import uuid
 import os
 import re
+import time
+import json
+import asyncio
+import aiohttp
+from collections import deque
+from typing import List, Optional, NamedTuple, Any, Tuple
+from datetime import datetime, timezone
 from io import BytesIO
 from PIL import Image
 
-db = DatabaseManager()
+# Общая HTTP-сессия для прямых вызовов Bot API (keep-alive соединения)
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия; создается при первом обращении, если lifespan ее еще не открыл"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=Config.HTTP_CONNECTION_LIMIT,
+            keepalive_timeout=Config.HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.HTTP_TIMEOUT_SECONDS)
+        )
+    return _http_session
+
+async def open_http_session() -> aiohttp.ClientSession:
+    """Создание общей HTTP-сессии (вызывается из lifespan FastAPI)"""
+    return get_http_session()
+
+async def close_http_session():
+    """Закрытие общей HTTP-сессии при остановке приложения"""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+class ModeratorRegistry:
+    """
+    Кэш активных модераторов в памяти.
+    Загружается из БД при первом обращении и сбрасывается через invalidate()
+    (при добавлении модератора) или по истечении TTL.
+    """
+    
+    def __init__(self, ttl_seconds: int = Config.MODERATOR_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._ids = frozenset()
+        self._profiles = ()
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+    
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+    
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            moderators = await db.get_active_moderators()
+            self._profiles = tuple(moderators)
+            self._ids = frozenset(moderator.user_id for moderator in self._profiles)
+            self._loaded_at = time.monotonic()
+    
+    async def get_moderators(self) -> tuple:
+        """Профили активных модераторов (записи Moderator)"""
+        await self._ensure_loaded()
+        return self._profiles
+    
+    async def get_ids(self) -> frozenset:
+        """ID активных модераторов"""
+        await self._ensure_loaded()
+        return self._ids
+    
+    def invalidate(self):
+        """Сброс кэша — следующий запрос перечитает модераторов из БД"""
+        self._loaded_at = None
+
+moderator_registry = ModeratorRegistry()
 
 def extract_base64_from_img_tags(img_tags: List[str]) -> List[str]:
     """
@@ -77,78 +157,372 @@ def optimize_image_for_telegram(image_path: str) -> str:
         print(f"❌ Ошибка оптимизации изображения: {e}")
         return image_path  # Возвращаем оригинальный путь в случае ошибки
 
-async def notify_moderators(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                          question_id: int, question_text: str, photos: list):
-    """Уведомляет всех модераторов о новом вопросе из Telegram"""
-    moderators = db.get_active_moderators()
-    user = update.effective_user
+class DeliveryResult(NamedTuple):
+    """Результат отправки одному получателю"""
+    moderator: tuple
+    result: Any
+    error: Optional[Exception]
+
+async def fan_out(moderators, send, concurrency: int = Config.NOTIFY_CONCURRENCY) -> List[DeliveryResult]:
+    """
+    Параллельная отправка всем модераторам с ограничением числа одновременных запросов.
+    send — корутина-функция, принимающая запись модератора.
+    Ошибки не прерывают рассылку, а возвращаются в результатах по каждому получателю.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
     
-    if not moderators:
-        print("⚠️ Нет активных модераторов для уведомления!")
-        return
+    async def deliver(moderator) -> DeliveryResult:
+        async with semaphore:
+            try:
+                return DeliveryResult(moderator, await send(moderator), None)
+            except Exception as e:
+                return DeliveryResult(moderator, None, e)
     
-    user_info = format_user_info(user)
+    return await asyncio.gather(*(deliver(moderator) for moderator in moderators))
+
+def log_delivery_results(results: List[DeliveryResult], description: str = "Уведомление"):
+    """Логирование результатов рассылки модераторам"""
+    for moderator, result, error in results:
+        moderator_id, username, first_name = moderator
+        if error is None:
+            print(f"✅ {description} отправлено модератору {first_name} (ID: {moderator_id})")
+        else:
+            print(f"❌ Ошибка отправки модератору {moderator_id}: {error}")
+
+def format_new_question_message(question, first_name: Optional[str] = None,
+                                username: Optional[str] = None) -> str:
+    """
+    Текст уведомления модераторам о новом вопросе (HTML).
+    Имя и username автора можно передать явно, если профиль еще не записан в базу.
+    """
+    if question.user_id == 0:
+        # Вопрос с сайта: текст уже экранирован и размечен при создании
+        return (
+            f"🌐 НОВЫЙ ВОПРОС С САЙТА #Q{question.id}\n\n"
+            f"{question.text}\n\n"
+        )
+    
+    user_info = f"👤 {html.escape(first_name or question.first_name or '')}"
+    if username or question.username:
+        user_info += f" (@{html.escape(username or question.username)})"
     
-    message_text = (
-        f"🚨 НОВЫЙ ВОПРОС #Q{question_id}\n"
+    return (
+        f"🚨 НОВЫЙ ВОПРОС #Q{question.id}\n"
         f"От: {user_info}\n"
-        f"ID пользователя: {user.id}\n\n"
-        f"❓ Вопрос:\n{question_text}\n\n"
-        f"💬 Ответьте командой: /answer_{question_id}"
+        f"ID пользователя: {question.user_id}\n\n"
+        f"❓ Вопрос:\n{html.escape(question.text)}\n\n"
+        f"💬 Ответьте командой: /answer_{question.id}"
     )
+
+QUESTION_STATUS_BADGES = {
+    'in_progress': '🟡 В работе: {moderator}',
+    'answered': '✅ Отвечен: {moderator}',
+    'error': '⚠️ Ответ {moderator} ожидает доставки пользователю',
+    'closed': '🔒 Закрыт',
+}
+
+def format_question_badge(question) -> str:
+    """Строка статуса вопроса для уведомлений модераторов (пустая для нового вопроса)"""
+    badge = QUESTION_STATUS_BADGES.get(question.status)
+    if not badge:
+        return ""
+    if question.moderator_username:
+        moderator = f"@{html.escape(question.moderator_username)}"
+    else:
+        moderator = f"ID {question.moderator_id}" if question.moderator_id else "—"
+    return badge.format(moderator=moderator)
+
+def notification_message_id(result) -> Optional[Tuple[int, bool]]:
+    """
+    (message_id, is_caption) отправленного уведомления по ответу Bot API.
+    У альбома подпись хранится в первом сообщении.
+    """
+    message = result[0] if isinstance(result, list) and result else result
+    if not isinstance(message, dict) or 'message_id' not in message:
+        return None
+    return message['message_id'], 'photo' in message
+
+async def edit_question_notifications(question_id: int):
+    """Перерисовывает уведомления о вопросе у всех модераторов по текущему статусу"""
+    messages = await db.get_moderator_messages(question_id)
+    if not messages:
+        return
+    question = await db.get_question(question_id)
+    if question is None:
+        return
+    
+    text = format_new_question_message(question)
+    badge = format_question_badge(question)
+    if badge:
+        text = f"{text.rstrip()}\n\n{badge}"
+    
+    async def edit(message):
+        method = 'editMessageCaption' if message.is_caption else 'editMessageText'
+        field = 'caption' if message.is_caption else 'text'
+        return await call_telegram_api(Config.BOT_TOKEN, method, message.moderator_id, {
+            'chat_id': message.moderator_id,
+            'message_id': message.message_id,
+            field: text,
+            'parse_mode': 'HTML'
+        })
     
-    await send_to_moderators(context, moderators, message_text, photos)
+    for message, result, error in await fan_out(messages, edit):
+        if error is not None and 'message is not modified' not in str(error):
+            print(f"❌ Ошибка обновления уведомления у модератора {message.moderator_id}: {error}")
 
-async def notify_moderators_web(question_id: int, question_text: str, photo_paths: list):
-    """Уведомляет модераторов о новом вопросе с сайта"""
-    moderators = db.get_active_moderators()
+class NotificationEditor:
+    """
+    Обновление уведомлений "НОВЫЙ ВОПРОС" при захвате/ответе.
+    События по одному вопросу, пришедшие в течение delay_ms, сливаются в одно
+    редактирование: к моменту отправки берется последний статус из базы.
+    """
     
-    if not moderators:
-        print("⚠️ Нет активных модераторов для уведомления!")
-        return
+    def __init__(self, delay_ms: int = Config.NOTIFICATION_EDIT_DELAY_MS):
+        self.delay = delay_ms / 1000
+        self._scheduled = {}
     
-    message_text = (
-        f"🌐 НОВЫЙ ВОПРОС С САЙТА #Q{question_id}\n\n"
-        f"{question_text}\n\n"
-    )
+    def schedule(self, question_id: int):
+        """Запланировать обновление уведомлений о вопросе"""
+        if question_id not in self._scheduled:
+            self._scheduled[question_id] = asyncio.create_task(self._edit_later(question_id))
+    
+    async def _edit_later(self, question_id: int):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            # Снимаем отметку до редактирования: события во время него запланируют новое
+            self._scheduled.pop(question_id, None)
+        
+        try:
+            await edit_question_notifications(question_id)
+        except Exception as e:
+            print(f"❌ Ошибка обновления уведомлений о вопросе #{question_id}: {e}")
+
+notification_editor = NotificationEditor()
+
+def format_digest_line(question) -> str:
+    """Строка дайджеста: #Q, начало текста и команда ответа (HTML)"""
+    text = question.text
+    if question.user_id == 0:
+        # Текст с сайта размечен HTML: обрезка посреди тега сломала бы разметку
+        text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    text = truncate_text(' '.join(text.split()), Config.DIGEST_TEXT_LENGTH)
+    return f"#Q{question.id} — {html.escape(text)}\n💬 /answer_{question.id}"
+
+class DigestBatcher:
+    """
+    Адаптивная группировка уведомлений о новых вопросах.
+    Если за последнюю минуту вопросов больше threshold_per_minute, уведомления копятся
+    и раз в interval_seconds уходят каждому модератору одним сообщением-дайджестом.
+    Когда поток спадает до половины порога, вопросы снова уведомляются по одному.
+    Задачи очереди уведомлений остаются захваченными, пока их вопрос не ушел в дайджест:
+    если процесс упадет раньше, задачи вернутся в очередь по истечении аренды.
+    """
+    
+    # Запас до лимита длины сообщения Telegram (4096)
+    MAX_MESSAGE_LENGTH = 4000
+    
+    def __init__(self, threshold_per_minute: int = Config.DIGEST_THRESHOLD_PER_MINUTE,
+                 interval_seconds: int = Config.DIGEST_INTERVAL_SECONDS):
+        self.threshold = threshold_per_minute
+        self.interval = interval_seconds
+        self.active = False
+        self._arrivals = deque()
+        self._pending = {}  # moderator_id -> (модератор, {question_id: вопрос})
+        self._jobs = []  # (задача очереди, ID модераторов-получателей)
     
-    # Оптимизируем фото перед отправкой
+    def record_arrival(self) -> bool:
+        """
+        Учет нового вопроса; возвращает True, если включен режим дайджеста.
+        Вызывается только для первой доставки вопроса, не для повторов и эскалаций.
+        """
+        if self.threshold <= 0:
+            return False
+        
+        now = time.monotonic()
+        self._arrivals.append(now)
+        while self._arrivals[0] <= now - 60:
+            self._arrivals.popleft()
+        
+        rate = len(self._arrivals)
+        if not self.active and rate > self.threshold:
+            self.active = True
+            print(f"📋 Поток вопросов {rate}/мин, уведомления собираются в дайджест")
+        elif self.active and rate <= self.threshold // 2:
+            self.active = False
+            print(f"📋 Поток вопросов {rate}/мин, уведомления снова по одному")
+        return self.active
+    
+    def add(self, question, moderators, job=None):
+        """
+        Добавление вопроса в ближайший дайджест для указанных модераторов.
+        job — задача очереди, которую нужно завершить по итогам отправки дайджеста.
+        """
+        for moderator in moderators:
+            self._pending.setdefault(moderator.user_id, (moderator, {}))[1][question.id] = question
+        if job is not None:
+            self._jobs.append((job, [moderator.user_id for moderator in moderators]))
+    
+    async def flush(self) -> Tuple[List[DeliveryResult], list]:
+        """
+        Отправка накопленного дайджеста (вопросы, которые уже взяли, пропускаются).
+        Возвращает результаты по модераторам и задачи очереди, вошедшие в дайджест.
+        """
+        if not self._pending:
+            return [], []
+        pending, self._pending = self._pending, {}
+        jobs, self._jobs = self._jobs, []
+        
+        question_ids = {question_id for _, questions in pending.values() for question_id in questions}
+        statuses = {question_id: await db.get_question_status(question_id) for question_id in question_ids}
+        
+        async def send(moderator):
+            questions = [
+                question for question in pending[moderator.user_id][1].values()
+                if statuses.get(question.id) == 'new'
+            ]
+            if not questions:
+                return []
+            
+            # Длинный дайджест делим на несколько сообщений
+            messages = []
+            text = f"📋 ДАЙДЖЕСТ НОВЫХ ВОПРОСОВ ({len(questions)})"
+            for question in questions:
+                line = format_digest_line(question)
+                if len(text) + len(line) + 2 > self.MAX_MESSAGE_LENGTH:
+                    messages.append(text)
+                    text = "📋 ДАЙДЖЕСТ (продолжение)"
+                text += f"\n\n{line}"
+            messages.append(text)
+            
+            return [await send_telegram_message(Config.BOT_TOKEN, moderator.user_id, message) for message in messages]
+        
+        results = await fan_out([moderator for moderator, _ in pending.values()], send)
+        log_delivery_results(results, "Уведомление (дайджест)")
+        return results, jobs
+
+digest_batcher = DigestBatcher()
+
+def optimize_photos(photo_paths: list) -> list:
+    """Оптимизация фото перед отправкой (оригинал, если оптимизация не удалась)"""
     optimized_photos = []
     for photo_path in photo_paths:
         try:
-            optimized_path = optimize_image_for_telegram(photo_path)
-            optimized_photos.append(optimized_path)
+            optimized_photos.append(optimize_image_for_telegram(photo_path))
         except Exception as e:
             print(f"❌ Ошибка оптимизации фото {photo_path}: {e}")
-            optimized_photos.append(photo_path)  # Используем оригинал если оптимизация не удалась
+            optimized_photos.append(photo_path)
+    return optimized_photos
+
+async def notify_moderators_about_question(question_id: int, photo_paths: list = (),
+                                           moderators: Optional[list] = None,
+                                           author: Optional[dict] = None,
+                                           job=None, first_arrival: bool = False) -> Optional[List[DeliveryResult]]:
+    """
+    Уведомляет модераторов о новом вопросе (из бота или с сайта).
+    Фото, уже загруженные в Telegram, отправляются по file_id; файлы с сайта (photo_paths)
+    загружаются один раз — первому модератору, которому удалась отправка, — а полученные
+    file_id сохраняются к вопросу и используются для остальных модераторов и /answer_N.
+    author — {'first_name', 'username'} автора на момент создания вопроса.
+    job — задача очереди: под нагрузкой она передается в дайджест, и функция возвращает None.
+    first_arrival — первая доставка вопроса (учитывается в скорости потока для дайджеста).
+    """
+    question = await db.get_question(question_id)
+    if question is None:
+        print(f"⚠️ Вопрос #{question_id} не найден, уведомление пропущено")
+        return []
+    
+    if moderators is None:
+        moderators = await moderator_registry.get_moderators()
+    if not moderators:
+        print("⚠️ Нет активных модераторов для уведомления!")
+        return []
+    
+    uploaded = await db.get_question_photos(question_id)
     
-    # Отправляем фото если есть
-    for moderator_id, username, first_name in moderators:
+    # Под нагрузкой вопрос уходит в дайджест. Вопросы с еще не загруженными фото с сайта
+    # уведомляются отдельно, чтобы фото попали в Telegram и были видны в /answer_N
+    if first_arrival:
+        digest_batcher.record_arrival()
+    if job is not None and digest_batcher.active and not (photo_paths and not uploaded):
+        digest_batcher.add(question, moderators, job)
+        return None
+    
+    message_text = format_new_question_message(question, **(author or {}))
+    
+    results = []
+    remaining = list(moderators)
+    optimized_photos = []
+    if photo_paths and not uploaded:
+        optimized_photos = await asyncio.to_thread(optimize_photos, photo_paths)
+    
+    while optimized_photos and remaining and not uploaded:
+        moderator = remaining.pop(0)
         try:
-            if optimized_photos:
-                if len(optimized_photos) == 1:
-                    # Одно фото с подписью
-                    await send_telegram_photo_from_path(Config.BOT_TOKEN, moderator_id, optimized_photos[0], message_text)
-                else:
-                    # Несколько фото - отправляем альбомом
-                    await send_telegram_media_group_from_paths(Config.BOT_TOKEN, moderator_id, optimized_photos, message_text)
+            if len(optimized_photos) == 1:
+                # Одно фото с подписью
+                result = await send_telegram_photo_from_path(Config.BOT_TOKEN, moderator.user_id, optimized_photos[0], message_text)
             else:
-                # Без фото - просто текст
-                await send_telegram_message(Config.BOT_TOKEN, moderator_id, message_text)
-            
-            print(f"✅ Уведомление отправлено модератору {first_name} (ID: {moderator_id})")
-            
+                # Несколько фото - отправляем альбомом
+                result = await send_telegram_media_group_from_paths(Config.BOT_TOKEN, moderator.user_id, optimized_photos, message_text)
         except Exception as e:
-            print(f"❌ Ошибка отправки модератору {moderator_id}: {e}")
+            results.append(DeliveryResult(moderator, None, e))
+            continue
+        
+        results.append(DeliveryResult(moderator, result, None))
+        uploaded = extract_photo_file_ids(result)
+        for photo in uploaded:
+            await db.add_question_photo(question_id, photo.file_id, photo.file_unique_id)
+    
+    async def send(moderator):
+        moderator_id = moderator.user_id
+        if uploaded:
+            return await send_telegram_photos_by_file_id(
+                Config.BOT_TOKEN, moderator_id, [photo.file_id for photo in uploaded], message_text
+            )
+        # Без фото - просто текст
+        return await send_telegram_message(Config.BOT_TOKEN, moderator_id, message_text)
+    
+    if not optimized_photos or uploaded:
+        results.extend(await fan_out(remaining, send))
+    log_delivery_results(results)
+    
+    # Запоминаем сообщения, чтобы дальше менять в них статус, а не слать новые
+    sent_messages = []
+    for moderator, result, error in results:
+        message = notification_message_id(result) if error is None else None
+        if message:
+            sent_messages.append((moderator.user_id, *message))
+    if sent_messages:
+        await db.save_moderator_messages(question_id, sent_messages)
+        # Статус перечитываем уже после сохранения сообщений: вопрос могли взять,
+        # пока шла рассылка, а правка видит только сохраненные сообщения
+        if await db.get_question_status(question_id) != 'new':
+            notification_editor.schedule(question_id)
+    return results
 
-def save_base64_image(base64_string: str, question_id: int, photo_index: int) -> str:
+def extract_photo_file_ids(result) -> List[QuestionPhoto]:
+    """
+    Достает file_id загруженных фото из ответа sendPhoto/sendMediaGroup
+    (одно сообщение или список сообщений). Берется самый крупный размер.
     """
-    Сохраняет base64 изображение в файл
+    messages = result if isinstance(result, list) else [result]
+    photos = []
+    for message in messages:
+        sizes = (message or {}).get('photo')
+        if sizes:
+            largest = sizes[-1]
+            photos.append(QuestionPhoto(largest['file_id'], largest['file_unique_id']))
+    return photos
+
+def save_base64_image(base64_string: str, folder_name: str, photo_index: int) -> str:
+    """
+    Сохраняет base64 изображение в файл в папке folder_name внутри PHOTOS_DIR
     Возвращает путь к сохраненному файлу
     """
     try:
         # Создаем папку для фото если не существует
-        photos_dir = os.path.join("uploads", "photos", str(question_id))
+        photos_dir = os.path.join(Config.PHOTOS_DIR, str(folder_name))
         os.makedirs(photos_dir, exist_ok=True)
         
         # Определяем тип изображения и расширение
@@ -185,31 +559,76 @@ def save_base64_image(base64_string: str, question_id: int, photo_index: int) ->
         print(f"❌ Ошибка сохранения base64 изображения: {e}")
         return None
 
+def move_staged_photos(staging_name: str, question_id: int, photo_paths: list) -> list:
+    """
+    Переносит фото из временной папки staging_name в папку вопроса.
+    Только переименования файлов, поэтому это можно выполнять внутри транзакции БД.
+    Папка вопроса может уже существовать (остаться от удаленного вопроса с тем же ID):
+    имена файлов уникальны, поэтому фото просто добавляются в нее.
+    Возвращает новые пути к файлам.
+    """
+    if not photo_paths:
+        return []
+    
+    staging_dir = os.path.join(Config.PHOTOS_DIR, staging_name)
+    photos_dir = os.path.join(Config.PHOTOS_DIR, str(question_id))
+    os.makedirs(photos_dir, exist_ok=True)
+    
+    moved_paths = []
+    for photo_path in photo_paths:
+        moved_path = os.path.join(photos_dir, os.path.basename(photo_path))
+        os.replace(photo_path, moved_path)
+        moved_paths.append(moved_path)
+    
+    os.rmdir(staging_dir)
+    return moved_paths
+
+async def read_telegram_response(response: aiohttp.ClientResponse):
+    """Разбирает ответ Bot API и возвращает поле result (или бросает TelegramAPIError)"""
+    try:
+        data = await response.json(content_type=None)
+    except (aiohttp.ContentTypeError, ValueError):
+        raise TelegramAPIError(response.status, await response.text())
+    
+    if response.status != 200 or not data.get('ok'):
+        parameters = data.get('parameters') or {}
+        raise TelegramAPIError(
+            response.status,
+            data.get('description', ''),
+            parameters.get('retry_after')
+        )
+    return data.get('result')
+
+async def call_telegram_api(bot_token: str, method: str, chat_id: int, payload: dict):
+    """Вызов метода Bot API с JSON-телом (с учетом лимитов отправки)"""
+    url = f"https://api.telegram.org/bot{bot_token}/{method}"
+    
+    async def post():
+        async with get_http_session().post(url, json=payload) as response:
+            return await read_telegram_response(response)
+    
+    return await rate_limiter.call(chat_id, post)
+
 async def send_telegram_photo_from_path(bot_token: str, chat_id: int, photo_path: str, caption: str = ""):
     """Отправляет фото в Telegram по пути к файлу"""
-    import aiohttp
-    
     url = f"https://api.telegram.org/bot{bot_token}/sendPhoto"
     
-    with open(photo_path, 'rb') as photo_file:
-        form_data = aiohttp.FormData()
-        form_data.add_field('chat_id', str(chat_id))
-        if caption:
-            form_data.add_field('caption', caption)
-            form_data.add_field('parse_mode', 'HTML')
-        form_data.add_field('photo', photo_file, filename=os.path.basename(photo_path))
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=form_data) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Telegram API error: {error_text}")
+    async def post():
+        with open(photo_path, 'rb') as photo_file:
+            form_data = aiohttp.FormData()
+            form_data.add_field('chat_id', str(chat_id))
+            if caption:
+                form_data.add_field('caption', caption)
+                form_data.add_field('parse_mode', 'HTML')
+            form_data.add_field('photo', photo_file, filename=os.path.basename(photo_path))
+            
+            async with get_http_session().post(url, data=form_data) as response:
+                return await read_telegram_response(response)
+    
+    return await rate_limiter.call(chat_id, post)
 
 async def send_telegram_media_group_from_paths(bot_token: str, chat_id: int, photo_paths: list, caption: str = ""):
     """Отправляет группу медиа в Telegram по путям к файлам"""
-    import aiohttp
-    import json
-    
     url = f"https://api.telegram.org/bot{bot_token}/sendMediaGroup"
     
     # Подготавливаем медиа группу
@@ -235,102 +654,65 @@ async def send_telegram_media_group_from_paths(bot_token: str, chat_id: int, pho
         
         media.append(media_item)
     
-    # Создаем form data
-    form_data = aiohttp.FormData()
-    form_data.add_field('chat_id', str(chat_id))
-    form_data.add_field('media', json.dumps(media))
-    
-    # Добавляем файлы
-    for file_key, file_content in files.items():
-        form_data.add_field(file_key, file_content, filename=f'{file_key}.jpg')
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data=form_data) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                # Если не удалось отправить альбом, пробуем отправить по одному
-                if "MEDIA_GROUP_INVALID" in error_text or "WEBP_NOT_SUPPORTED" in error_text:
-                    print(f"⚠️ Не удалось отправить альбом, отправляю фото по одному: {error_text}")
-                    await send_photos_individually_from_paths(bot_token, chat_id, photo_paths, caption)
-                else:
-                    raise Exception(f"Telegram API error: {error_text}")
+    async def post():
+        # FormData одноразовая, поэтому собираем ее заново при каждом повторе
+        form_data = aiohttp.FormData()
+        form_data.add_field('chat_id', str(chat_id))
+        form_data.add_field('media', json.dumps(media))
+        
+        # Добавляем файлы
+        for file_key, file_content in files.items():
+            form_data.add_field(file_key, file_content, filename=f'{file_key}.jpg')
+        
+        async with get_http_session().post(url, data=form_data) as response:
+            return await read_telegram_response(response)
+    
+    try:
+        return await rate_limiter.call(chat_id, post)
+    except TelegramAPIError as e:
+        # Если не удалось отправить альбом, пробуем отправить по одному
+        if "MEDIA_GROUP_INVALID" in e.description or "WEBP_NOT_SUPPORTED" in e.description:
+            print(f"⚠️ Не удалось отправить альбом, отправляю фото по одному: {e.description}")
+            return await send_photos_individually_from_paths(bot_token, chat_id, photo_paths, caption)
+        raise
+
+async def send_telegram_photos_by_file_id(bot_token: str, chat_id: int, file_ids: list, caption: str = ""):
+    """Отправляет уже загруженные в Telegram фото по file_id, без повторной загрузки файлов"""
+    if len(file_ids) == 1:
+        method = "sendPhoto"
+        payload = {"chat_id": chat_id, "photo": file_ids[0]}
+        if caption:
+            payload["caption"] = caption
+            payload["parse_mode"] = "HTML"
+    else:
+        method = "sendMediaGroup"
+        media = [{"type": "photo", "media": file_id} for file_id in file_ids]
+        if caption:
+            media[0]["caption"] = caption
+            media[0]["parse_mode"] = "HTML"
+        payload = {"chat_id": chat_id, "media": media}
+    
+    return await call_telegram_api(bot_token, method, chat_id, payload)
 
 async def send_photos_individually_from_paths(bot_token: str, chat_id: int, photo_paths: list, caption: str = ""):
     """Отправляет фото по одному (fallback метод)"""
+    messages = []
     for i, photo_path in enumerate(photo_paths):
         # Первое фото с подписью, остальные без
         photo_caption = caption if i == 0 else ""
-        await send_telegram_photo_from_path(bot_token, chat_id, photo_path, photo_caption)
+        messages.append(await send_telegram_photo_from_path(bot_token, chat_id, photo_path, photo_caption))
+    return messages
 
-async def send_to_moderators(context: ContextTypes.DEFAULT_TYPE, moderators: list, 
-                           message_text: str, photos: list):
-    """Отправляет сообщение всем модераторам"""
-    for moderator_id, username, first_name in moderators:
-        try:
-            if photos and hasattr(photos[0], 'get'):
-                # Telegram фото (из бота)
-                if len(photos) == 1:
-                    await context.bot.send_photo(
-                        chat_id=moderator_id,
-                        photo=photos[0]['file_id'],
-                        caption=message_text
-                    )
-                else:
-                    media_group = []
-                    media_group.append(
-                        InputMediaPhoto(
-                            media=photos[0]['file_id'],
-                            caption=message_text
-                        )
-                    )
-                    for photo in photos[1:]:
-                        media_group.append(InputMediaPhoto(media=photo['file_id']))
-                    
-                    await context.bot.send_media_group(
-                        chat_id=moderator_id,
-                        media=media_group
-                    )
-            else:
-                # Текстовое сообщение
-                await context.bot.send_message(
-                    chat_id=moderator_id,
-                    text=message_text
-                )
-            
-            print(f"✅ Уведомление отправлено модератору {first_name} (ID: {moderator_id})")
-            
-        except Exception as e:
-            print(f"❌ Ошибка отправки модератору {moderator_id}: {e}")
-
-async def send_telegram_message(bot_token: str, chat_id: int, text: str):
-    """Отправляет сообщение в Telegram через API"""
-    import aiohttp
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+async def send_telegram_message(bot_token: str, chat_id: int, text: str, parse_mode: Optional[str] = "HTML"):
+    """Отправляет сообщение в Telegram через API (parse_mode=None — простой текст)"""
     payload = {
         "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML"
+        "text": text
     }
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                raise Exception(f"Telegram API error: {error_text}")
-
-async def notify_moderators_about_taken_question(question_id: int, moderator_name: str, context: ContextTypes.DEFAULT_TYPE):
-    """Уведомляет модераторов о том, что вопрос взят в работу"""
-    moderators = db.get_active_moderators()
-    
-    for moderator_id, username, first_name in moderators:
-        try:
-            await context.bot.send_message(
-                chat_id=moderator_id,
-                text=f"ℹ️ Вопрос #Q{question_id} взят в работу модератором {moderator_name}"
-            )
-        except Exception as e:
-            print(f"❌ Ошибка отправки уведомления модератору {moderator_id}: {e}")
+    return await call_telegram_api(bot_token, "sendMessage", chat_id, payload)
 
 def format_user_info(user) -> str:
     """Форматирование информации о пользователе"""
@@ -339,11 +721,74 @@ def format_user_info(user) -> str:
         user_info += f" (@{user.username})"
     return user_info
 
-def is_moderator(user_id: int) -> bool:
+async def is_moderator(user_id: int) -> bool:
     """Проверка, является ли пользователь модератором"""
-    moderators = db.get_active_moderators()
-    moderator_ids = [mod[0] for mod in moderators]
-    return user_id in moderator_ids
+    return user_id in await moderator_registry.get_ids()
+
+def format_duration(seconds: int) -> str:
+    """Форматирование длительности: 45с, 12м, 3ч 05м, 2д 4ч"""
+    if seconds is None:
+        return "—"
+    if seconds < 60:
+        return f"{seconds}с"
+    minutes = seconds // 60
+    if minutes < 60:
+        return f"{minutes}м"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours}ч {minutes:02d}м"
+    days, hours = divmod(hours, 24)
+    return f"{days}д {hours}ч"
+
+def format_sla_line(title: str, summary: dict) -> str:
+    """Строка перцентилей SLA: p50 / p90 / p99 и количество наблюдений"""
+    return (
+        f"• {title}: p50 {format_duration(summary['p50'])}, "
+        f"p90 {format_duration(summary['p90'])}, "
+        f"p99 {format_duration(summary['p99'])} ({summary['count']})"
+    )
+
+def format_statistics(stats: dict, sla: dict, moderators: tuple) -> str:
+    """Форматирование статистики для команды /stats"""
+    questions = stats['questions']
+    feedbacks = stats['feedbacks']
+    answers = stats['answers']
+    by_status = questions['by_status']
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    
+    lines = [
+        "📊 Статистика обратной связи:",
+        f"• Всего вопросов: {questions['total']}",
+        f"• Новых вопросов: {by_status.get('new', 0)}",
+        f"• В работе: {by_status.get('in_progress', 0)}",
+        f"• Отвечено: {by_status.get('answered', 0)}",
+        f"• Ошибок доставки: {by_status.get('error', 0)}",
+        f"• Всего отзывов: {feedbacks['total']}",
+        f"• Ответов отправлено: {answers['total']}",
+        "",
+        "📅 Сегодня:",
+        f"• Вопросов: {questions['by_day'].get(today, 0)}",
+        f"• Отзывов: {feedbacks['by_day'].get(today, 0)}",
+        f"• Ответов: {answers['by_day'].get(today, 0)}",
+    ]
+    
+    names = {str(moderator.user_id): moderator.first_name for moderator in moderators}
+    
+    if sla['answer']['overall']['count'] or sla['claim']['overall']['count']:
+        lines.append("")
+        lines.append("⏱️ Скорость реакции (за 7 дней):")
+        lines.append(format_sla_line("До взятия в работу", sla['claim']['overall']))
+        lines.append(format_sla_line("До ответа", sla['answer']['overall']))
+        for moderator_id, summary in sla['answer']['by_moderator'].items():
+            lines.append(format_sla_line(f"Ответ, {names.get(moderator_id, moderator_id)}", summary))
+    
+    if answers['by_moderator']:
+        lines.append("")
+        lines.append("👥 Ответы по модераторам:")
+        for moderator_id, count in sorted(answers['by_moderator'].items(), key=lambda item: -item[1]):
+            lines.append(f"• {names.get(moderator_id, moderator_id)}: {count}")
+    
+    return '\n'.join(lines)
 
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
@@ -358,6 +803,7 @@ def truncate_text(text: str, max_length: int = 100) -> str:
 async def send_to_user(context: ContextTypes.DEFAULT_TYPE, user_id: int, text: str):
     """Отправляет сообщение пользователю"""
     try:
+        # Лимиты применяет BotRateLimiter приложения
         await context.bot.send_message(chat_id=user_id, text=text)
         return True
     except Exception as e:
@@ -0,0 +1,118 @@
+import asyncio
+import glob
+import os
+import shutil
+import time
+from datetime import datetime
+from config import Config
+
+# Не допускаем одновременных бэкапов (по расписанию и по команде /backup)
+backup_lock = asyncio.Lock()
+
+def remove_question_photos(question_ids: list):
+    """Удаление папок с фотографиями вопросов"""
+    for question_id in question_ids:
+        photos_dir = os.path.join(Config.PHOTOS_DIR, str(question_id))
+        if os.path.isdir(photos_dir):
+            shutil.rmtree(photos_dir, ignore_errors=True)
+
+def remove_stale_staging_photos(max_age_hours: int = Config.PHOTO_STAGING_MAX_AGE_HOURS) -> int:
+    """Удаление временных папок фото с сайта, которые так и не перенесли в папку вопроса"""
+    removed = 0
+    deadline = time.time() - max_age_hours * 3600
+    for staging_dir in glob.glob(os.path.join(Config.PHOTOS_DIR, 'staging-*')):
+        try:
+            if os.path.getmtime(staging_dir) < deadline:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                removed += 1
+        except OSError:
+            # Папку успели перенести или удалить
+            continue
+    return removed
+
+async def run_retention_once(db) -> dict:
+    """
+    Один проход архивации: переносит старые закрытые вопросы и отзывы в архивную БД
+    порциями по RETENTION_BATCH_SIZE, удаляет их фото и обслуживает БД.
+    """
+    archived_questions = 0
+    archived_feedbacks = 0
+    
+    while True:
+        question_ids = await db.archive_old_questions(Config.RETENTION_DAYS, Config.RETENTION_BATCH_SIZE)
+        if not question_ids:
+            break
+        await asyncio.to_thread(remove_question_photos, question_ids)
+        archived_questions += len(question_ids)
+        # Отдаем управление между порциями, чтобы не держать писателя долго
+        await asyncio.sleep(0)
+    
+    while True:
+        count = await db.archive_old_feedbacks(Config.RETENTION_DAYS, Config.RETENTION_BATCH_SIZE)
+        if not count:
+            break
+        archived_feedbacks += count
+        await asyncio.sleep(0)
+    
+    purged_notifications = await db.purge_failed_notifications(Config.OUTBOX_FAILED_RETENTION_DAYS)
+    if purged_notifications:
+        print(f"🧹 Удалено старых недоставленных уведомлений: {purged_notifications}")
+    
+    await db.run_maintenance(Config.VACUUM_PAGES_PER_RUN)
+    
+    stale_staging = await asyncio.to_thread(remove_stale_staging_photos)
+    if stale_staging:
+        print(f"🧹 Удалено незавершенных загрузок фото: {stale_staging}")
+    
+    if archived_questions or archived_feedbacks:
+        print(f"🗄️ В архив перенесено вопросов: {archived_questions}, отзывов: {archived_feedbacks}")
+    
+    return {'questions': archived_questions, 'feedbacks': archived_feedbacks}
+
+async def run_retention(db):
+    """Фоновая задача архивации и обслуживания БД по расписанию"""
+    while True:
+        try:
+            await run_retention_once(db)
+        except Exception as e:
+            print(f"❌ Ошибка архивации БД: {e}")
+        
+        await asyncio.sleep(Config.RETENTION_INTERVAL_HOURS * 3600)
+
+async def run_backup_once(db) -> str:
+    """
+    Создает резервную копию БД в BACKUP_DIR и удаляет старые копии сверх BACKUP_KEEP.
+    Возвращает путь к созданному файлу.
+    """
+    async with backup_lock:
+        os.makedirs(Config.BACKUP_DIR, exist_ok=True)
+        
+        base_name = db.backup_name
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        backup_path = os.path.join(Config.BACKUP_DIR, f"{base_name}-{timestamp}.db")
+        temp_path = backup_path + '.tmp'
+        
+        try:
+            await db.backup(temp_path)
+            # Готовая копия появляется под итоговым именем только целиком
+            os.replace(temp_path, backup_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        backups = sorted(glob.glob(os.path.join(Config.BACKUP_DIR, f"{base_name}-*.db")))
+        for old_backup in backups[:-Config.BACKUP_KEEP]:
+            os.remove(old_backup)
+        
+        print(f"💾 Резервная копия БД создана: {backup_path}")
+        return backup_path
+
+async def run_backups(db):
+    """Фоновая задача резервного копирования БД по расписанию"""
+    while True:
+        await asyncio.sleep(Config.BACKUP_INTERVAL_HOURS * 3600)
+        try:
+            await run_backup_once(db)
+        except Exception as e:
+            print(f"❌ Ошибка резервного копирования БД: {e}")
@@ -0,0 +1,160 @@
+import asyncio
+from config import Config
+from utils.helpers import (
+    notify_moderators_about_question, moderator_registry, send_telegram_message, notification_editor,
+    digest_batcher
+)
+from utils.rate_limiter import TelegramAPIError
+from utils.routing import route_question
+
+# Будит воркеров сразу после постановки задачи, не дожидаясь очередного опроса
+outbox_wakeup = asyncio.Event()
+
+def wake_outbox_workers():
+    """Сигнал воркерам: в очереди появилась задача"""
+    outbox_wakeup.set()
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная пауза перед следующей попыткой"""
+    return min(Config.OUTBOX_MAX_BACKOFF_SECONDS, Config.OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+def is_permanent_error(error: Exception) -> bool:
+    """Ошибки, которые повтор не исправит (бот заблокирован, чат не найден, неверный запрос)"""
+    return isinstance(error, TelegramAPIError) and error.status in (400, 403)
+
+async def deliver_new_question(db, job):
+    """
+    Уведомление модераторов о новом вопросе.
+    Получатели выбираются при первой попытке по режиму маршрутизации (targets = None — все).
+    В payload запоминается, кому уже доставлено, чтобы повтор не дублировал сообщения.
+    Возвращает (обновленный payload, список ошибок); ошибки None — задача передана
+    в дайджест и будет завершена после его отправки.
+    """
+    payload = dict(job.payload)
+    # Повторы и эскалации (targets задан заранее) не учитываются в скорости потока
+    first_arrival = job.attempts == 1 and 'targets' not in payload
+    moderators = await moderator_registry.get_moderators()
+    if 'targets' not in payload:
+        payload['targets'] = await route_question(db, job.question_id, moderators)
+    
+    targets = payload['targets']
+    delivered = set(payload.get('delivered', []))
+    moderators = [
+        moderator for moderator in moderators
+        if moderator.user_id not in delivered and (targets is None or moderator.user_id in targets)
+    ]
+    
+    results = await notify_moderators_about_question(
+        job.question_id, payload.get('photo_paths', []), moderators, payload.get('author'),
+        job=job._replace(payload=payload), first_arrival=first_arrival
+    )
+    if results is None:
+        return payload, None
+    
+    delivered.update(result.moderator.user_id for result in results if result.error is None)
+    payload['delivered'] = sorted(delivered)
+    return payload, [result.error for result in results if result.error is not None]
+
+async def deliver_answer(db, job):
+    """
+    Повторная отправка ответа, который не удалось доставить пользователю сразу.
+    После успешной отправки вопрос переводится в 'answered'.
+    """
+    payload = job.payload
+    try:
+        await send_telegram_message(Config.BOT_TOKEN, payload['user_id'], payload['text'], parse_mode=None)
+    except Exception as e:
+        return payload, [e]
+    
+    await db.update_question_status(job.question_id, 'answered')
+    notification_editor.schedule(job.question_id)
+    print(f"✅ Ответ #{payload['answer_id']} доставлен пользователю {payload['user_id']} с попытки {job.attempts}")
+    return payload, []
+
+# Обработчики задач по типу (kind)
+OUTBOX_HANDLERS = {
+    'new_question': deliver_new_question,
+    'answer_delivery': deliver_answer,
+}
+
+async def process_notification(db, job):
+    """Выполнение одной задачи и запись результата в очередь"""
+    handler = OUTBOX_HANDLERS.get(job.kind)
+    if handler is None:
+        await db.fail_notification(job.id, f"Неизвестный тип задачи: {job.kind}", None)
+        return
+    
+    try:
+        payload, errors = await handler(db, job)
+    except Exception as e:
+        payload, errors = None, [e]
+    
+    if errors is None:
+        # Задача остается захваченной до отправки дайджеста
+        return
+    await finish_notification(db, job, payload, errors)
+
+async def finish_notification(db, job, payload, errors: list):
+    """Запись результата задачи: удаление, повтор с паузой или окончательная ошибка"""
+    if not errors:
+        await db.complete_notification(job.id)
+        return
+    
+    error_text = '; '.join(str(error) for error in errors)
+    if job.attempts >= Config.OUTBOX_MAX_ATTEMPTS or all(is_permanent_error(error) for error in errors):
+        print(f"❌ Уведомление #{job.id} ({job.kind}) окончательно не доставлено (попыток: {job.attempts}): {error_text}")
+        await db.fail_notification(job.id, error_text, None, payload)
+    else:
+        delay = retry_delay(job.attempts)
+        print(f"⚠️ Уведомление #{job.id} ({job.kind}): попытка {job.attempts} неудачна, повтор через {delay} с")
+        await db.fail_notification(job.id, error_text, delay, payload)
+
+async def flush_digest(db):
+    """
+    Отправка накопленного дайджеста и завершение вошедших в него задач.
+    Задачи модераторов, которым дайджест не доставлен, возвращаются в очередь.
+    """
+    results, jobs = await digest_batcher.flush()
+    errors = {result.moderator.user_id: result.error for result in results if result.error is not None}
+    
+    for job, moderator_ids in jobs:
+        payload = dict(job.payload)
+        delivered = set(payload.get('delivered', []))
+        delivered.update(moderator_id for moderator_id in moderator_ids if moderator_id not in errors)
+        payload['delivered'] = sorted(delivered)
+        await finish_notification(
+            db, job, payload, [errors[moderator_id] for moderator_id in moderator_ids if moderator_id in errors]
+        )
+
+async def run_digest(db):
+    """Фоновая задача: периодическая отправка дайджеста"""
+    while True:
+        await asyncio.sleep(digest_batcher.interval)
+        try:
+            await flush_digest(db)
+        except Exception as e:
+            print(f"❌ Ошибка отправки дайджеста: {e}")
+
+async def run_outbox_worker(db):
+    """Воркер очереди уведомлений: забирает задачи по одной"""
+    while True:
+        # Сбрасываем сигнал до выборки, чтобы не пропустить задачу, поставленную во время нее
+        outbox_wakeup.clear()
+        try:
+            jobs = await db.claim_notifications(1, Config.OUTBOX_LEASE_SECONDS)
+        except Exception as e:
+            print(f"❌ Ошибка выборки из очереди уведомлений: {e}")
+            jobs = []
+        
+        if jobs:
+            await process_notification(db, jobs[0])
+            continue
+        
+        try:
+            await asyncio.wait_for(outbox_wakeup.wait(), Config.OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_outbox_workers(db, workers: int = Config.OUTBOX_WORKERS):
+    """Пул воркеров очереди уведомлений (запускается из start_bot в bot.py)"""
+    await asyncio.gather(*(run_outbox_worker(db) for _ in range(workers)))
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from datetime import timedelta
+from typing import Optional
+from telegram.ext import BaseRateLimiter
+from config import Config
+
+class TelegramAPIError(Exception):
+    """Ошибка прямого вызова Bot API (с retry_after для ответа 429)"""
+    
+    def __init__(self, status: int, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"Telegram API error: {description}")
+        self.status = status
+        self.description = description
+        self.retry_after = retry_after
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Пауза в секундах, которую требует Telegram (ответ 429), или None.
+    Понимает RetryAfter из python-telegram-bot и TelegramAPIError.
+    """
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        return None
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity подряд"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        """Ожидание свободного токена (запросы обслуживаются по очереди)"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+class TelegramRateLimiter:
+    """
+    Общий ограничитель отправок в Telegram: глобальный лимит (~30 сообщений/с)
+    и лимит на чат (~1 сообщение/с). При ответе 429 все отправки приостанавливаются
+    на retry_after, а запрос повторяется — сообщения ждут в очереди, а не теряются.
+    """
+    
+    # Порог числа корзин чатов, после которого простаивающие корзины удаляются
+    MAX_CHAT_BUCKETS = 10000
+    
+    def __init__(self, global_rate: float = Config.TELEGRAM_GLOBAL_RATE,
+                 per_chat_rate: float = Config.TELEGRAM_PER_CHAT_RATE,
+                 max_retries: int = Config.TELEGRAM_MAX_RETRIES):
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._paused_until = 0.0
+    
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle()}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+    
+    async def acquire(self, chat_id: int):
+        """Ожидание разрешения на отправку в чат"""
+        await self._chat_bucket(chat_id).acquire()
+        await self._global.acquire()
+        
+        # Глобальная пауза после 429
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    async def call(self, chat_id: int, func, *args, **kwargs):
+        """
+        Вызов отправки с учетом лимитов.
+        При 429 ждем retry_after (с экспоненциальным ростом паузы при повторах)
+        и повторяем до max_retries раз.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                retry_after = get_retry_after(e)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+                
+                delay = max(retry_after, 2 ** attempt) + random.uniform(0, 0.5)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                attempt += 1
+                print(f"⏳ Telegram 429 для чата {chat_id}: повтор #{attempt} через {delay:.1f} с")
+
+rate_limiter = TelegramRateLimiter()
+
+class BotRateLimiter(BaseRateLimiter):
+    """
+    Подключает общий rate_limiter к Application python-telegram-bot: через него
+    проходят все запросы бота (reply_text, send_message и т. д.) из обработчиков.
+    Запросы без chat_id (getUpdates, getMe, answerCallbackQuery) не ограничиваются.
+    """
+    
+    def __init__(self, limiter: TelegramRateLimiter = rate_limiter):
+        self.limiter = limiter
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = (data or {}).get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+        return await self.limiter.call(chat_id, callback, *args, **kwargs)
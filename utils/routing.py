@@ -0,0 +1,96 @@
+import asyncio
+from typing import List, Optional
+from config import Config
+from utils.helpers import moderator_registry
+
+def next_in_rotation(moderators, after_id: Optional[int]):
+    """Следующий модератор по кругу (по возрастанию ID) после after_id"""
+    ordered = sorted(moderators, key=lambda moderator: moderator.user_id)
+    for moderator in ordered:
+        if after_id is None or moderator.user_id > after_id:
+            return moderator
+    return ordered[0]
+
+async def pick_round_robin(db, question, moderators):
+    """По кругу: следующий после того, кому назначен предыдущий вопрос"""
+    return next_in_rotation(moderators, await db.get_last_assigned_moderator())
+
+async def pick_least_loaded(db, question, moderators):
+    """Модератор с наименьшим числом взятых и назначенных вопросов (при равенстве — по кругу)"""
+    loads = await db.get_moderator_loads()
+    ordered = sorted(moderators, key=lambda moderator: moderator.user_id)
+    start = ordered.index(next_in_rotation(ordered, await db.get_last_assigned_moderator()))
+    rotated = ordered[start:] + ordered[:start]
+    return min(rotated, key=lambda moderator: loads.get(moderator.user_id, 0))
+
+async def pick_sticky(db, question, moderators):
+    """Модератор, который вел предыдущий вопрос пользователя, иначе наименее загруженный"""
+    # Вопросы с сайта (user_id = 0) к пользователю не привязаны
+    if question.user_id:
+        previous = await db.get_user_last_moderator(question.user_id, question.id)
+        for moderator in moderators:
+            if moderator.user_id == previous:
+                return moderator
+    return await pick_least_loaded(db, question, moderators)
+
+# Режимы маршрутизации (Config.ROUTING_MODE); 'broadcast' — уведомлять всех
+ROUTING_STRATEGIES = {
+    'round_robin': pick_round_robin,
+    'least_loaded': pick_least_loaded,
+    'sticky': pick_sticky,
+}
+
+async def route_question(db, question_id: int, moderators, mode: str = Config.ROUTING_MODE) -> Optional[List[int]]:
+    """
+    Выбор получателей уведомления о новом вопросе.
+    Возвращает ID назначенного модератора (в списке) или None — уведомить всех.
+    """
+    strategy = ROUTING_STRATEGIES.get(mode)
+    if strategy is None or not moderators:
+        return None
+    
+    question = await db.get_question(question_id)
+    if question is None:
+        return None
+    
+    moderator = await strategy(db, question, moderators)
+    await db.assign_question(question_id, moderator.user_id)
+    print(f"🧭 Вопрос #Q{question_id} назначен модератору {moderator.first_name} (ID: {moderator.user_id})")
+    return [moderator.user_id]
+
+async def escalate_unclaimed_questions(db) -> list:
+    """
+    Передает назначенные, но не взятые вовремя вопросы следующему модератору по кругу.
+    Когда вопрос побывал у всех, назначение снимается: его может взять любой модератор.
+    """
+    moderators = await moderator_registry.get_moderators()
+    timeout_seconds = Config.ROUTING_ESCALATION_MINUTES * 60
+    escalated = []
+    
+    for question_id, assigned_to, escalations in await db.get_unclaimed_assignments(timeout_seconds):
+        others = [moderator for moderator in moderators if moderator.user_id != assigned_to]
+        if not others:
+            continue
+        
+        if escalations + 1 >= len(moderators):
+            # Уведомление уже получили все модераторы
+            if await db.escalate_question(question_id, [], None):
+                print(f"⏫ Вопрос #Q{question_id} не взяли ни у одного модератора, назначение снято")
+            continue
+        
+        next_moderator = next_in_rotation(others, assigned_to)
+        if await db.escalate_question(question_id, [next_moderator.user_id], next_moderator.user_id):
+            escalated.append(question_id)
+            print(f"⏫ Вопрос #Q{question_id} не взят вовремя, передан модератору {next_moderator.first_name} (ID: {next_moderator.user_id})")
+    
+    return escalated
+
+async def run_routing_escalation(db):
+    """Фоновая задача: периодически эскалирует невзятые назначенные вопросы"""
+    while True:
+        try:
+            await escalate_unclaimed_questions(db)
+        except Exception as e:
+            print(f"❌ Ошибка эскалации вопросов: {e}")
+        
+        await asyncio.sleep(Config.ROUTING_SWEEP_INTERVAL_SECONDS)